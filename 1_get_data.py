@@ -1,36 +1,38 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from yfinance import Ticker
 import pandas as pd
-from yahoofinancials import YahooFinancials
-import requests
-from tqdm import tqdm
-import time
-import pickle
 
-# with open('tmp.pickle', 'rb') as f:
-#     statements, tickers_done = pickle.load(f)
+import storage
+from config import PROJECTS, REF_INDEXES
+from fetch import Fetcher
+from incremental import fetch_delta, delta_starts, merge_downloads, write_updates
+from journal import Journal
 
+# Only download the prices missing from the existing stores
+incremental = True
+# Also export the datasets as csv files
+export_csv = False
 
-# Download function
-def _download_one(ticker, start=None, end=None,
-                  auto_adjust=False, back_adjust=False,
-                  actions=False, period="max", interval="1d",
-                  prepost=False, proxy=None, rounding=False):
+# Concurrent downloader shared by all the projects, YAHOO_URL by default
+fetcher = Fetcher(workers=8, rate=2, burst=4)
+# Ingestion journal, completed tickers are skipped when the run is resumed
+journal = Journal("data/journal.sqlite")
 
-    return Ticker(ticker).history(period=period, interval=interval,
-                                  start=start, end=end, prepost=prepost,
-                                  actions=actions, auto_adjust=auto_adjust,
-                                  back_adjust=back_adjust, proxy=proxy,
-                                  rounding=rounding, many=True)
+
+# Tickers whose download failed after all the retries, downloaded again on
+# the next run
+def report(failures, dataset):
+    if failures:
+        print(f"{len(failures)} {dataset} downloads failed")
+        for ticker, e in failures:
+            print(f"Error on {ticker} : {e}")
 
 
-# Modify project and reference index according to your needs
 tickers_all = []
-for project in ["sp500", "nyse", "nasdaq"]:
+for project in PROJECTS:
     print(project)
-    ref_index = ["^GSPC", "^IXIC"]
+    ref_index = REF_INDEXES
 
     # Load tickers
     companies = pd.read_csv(f"data/{project}/{project}.csv", sep=",")
@@ -38,84 +40,55 @@ for project in ["sp500", "nyse", "nasdaq"]:
     tickers = [a for a in tickers if a not in tickers_all and "^" not in a and r"/" not in a]
     tickers_all += tickers
 
-    # Download prices
-    full_data = {}
-    for ticker in tqdm(tickers + ref_index):
-        tckr = _download_one(ticker,
-                             period="7y",
-                             actions=True)
-        full_data[ticker] = tckr
-    ohlc = pd.concat(full_data.values(), axis=1,
-                     keys=full_data.keys())
-    ohlc.columns = ohlc.columns.swaplevel(0, 1)
-    ohlc.sort_index(level=0, axis=1, inplace=True)
-    prices = ohlc["Adj Close"]
-    dividends = ohlc["Dividends"]
-    prices.to_csv(f"data/{project}/prices_daily.csv")
-    dividends.to_csv(f"data/{project}/dividends.csv")
-
-    statements = {}
-    tickers_done = []
-    for ticker in tqdm(tickers):
-        # Get statements
-        if ticker in tickers_done:
-            continue
-        yahoo_financials = YahooFinancials(ticker)
-        stmts_codes = ['income', 'cash', 'balance']
-        all_statement_data = yahoo_financials.get_financial_stmts('annual',
-                                                                  stmts_codes)
-        # build statements dictionnary
-        for a in all_statement_data.keys():
-            if a not in statements:
-                statements[a] = list()
-            for b in all_statement_data[a]:
-                try:
-                    for result in all_statement_data[a][b]:
-                        extracted_date = list(result)[0]
-                        dataframe_row = list(result.values())[0]
-                        dataframe_row['date'] = extracted_date
-                        dataframe_row['symbol'] = b
-                        statements[a].append(dataframe_row)
-                except Exception as e:
-                    print("Error on " + ticker + " : " + a)
-        tickers_done.append(ticker)
-        with open('tmp.pickle', 'wb') as f:
-            pickle.dump([statements, tickers_done], f)
-
-    # save dataframes
-    for a in all_statement_data.keys():
-        df = pd.DataFrame(statements[a]).set_index('date')
-        df.to_csv(f"data/{project}/{a}.csv")
+    # Download prices, from the last stored date in incremental mode
+    starts = {}
+    prices_old = dividends_old = None
+    if incremental and storage.exists("prices_daily", project):
+        prices_old = storage.read_wide("prices_daily", project)
+        dividends_old = storage.read_wide("dividends", project)
+        starts = delta_starts(prices_old)
+    downloads, failures = fetcher.map(lambda a: fetch_delta(fetcher, a, starts.get(a)),
+                                      tickers + ref_index,
+                                      desc="prices")
+    report(failures, "prices")
+    prices, dividends, updates = merge_downloads(downloads, prices_old, dividends_old)
+    write_updates(project, updates)
+    if prices is not None:
+        storage.write(prices, "prices_daily", project, csv=export_csv)
+        storage.write(dividends, "dividends", project, csv=export_csv)
+
+    # Get statements
+    done = journal.done(project, "statements")
+    _, failures = fetcher.map(fetcher.statements,
+                              [a for a in tickers if a not in done],
+                              desc="statements",
+                              callback=lambda a, stmts: journal.append(project, "statements", a, stmts))
+    report(failures, "statements")
+
+    # save dataframes, then clear the journal so that the next run refreshes
+    # all the tickers
+    for a, df in journal.compact(project, "statements").items():
+        storage.write(df, a, project, csv=export_csv)
+    journal.clear(project, "statements")
 
     # Donwload shares
-    shares = []
-    tickers_done = []
-    for ticker in tqdm(tickers):
-        if ticker in tickers_done:
-            continue
-        d = requests.get(f"https://query1.finance.yahoo.com/ws/fundamentals-timeseries/v1/finance/timeseries/{ticker}?symbol={ticker}&padTimeSeries=true&type=annualPreferredSharesNumber,annualOrdinarySharesNumber&merge=false&period1=0&period2=2013490868")
-        if not d.ok:
-            time.sleep(300)
-            d = requests.get(f"https://query1.finance.yahoo.com/ws/fundamentals-timeseries/v1/finance/timeseries/{ticker}?symbol={ticker}&padTimeSeries=true&type=annualPreferredSharesNumber,annualOrdinarySharesNumber&merge=false&period1=0&period2=2013490868")
-        ctn = d.json()['timeseries']['result']
-        dct = dict()
-        for n in ctn:
-            type = n['meta']['type'][0]
-            dct[type] = dict()
-            if type in n:
-                for o in n[type]:
-                    if o is not None:
-                        dct[type][o['asOfDate']] = o['reportedValue']['raw']
-        df = pd.DataFrame.from_dict(dct)
-        df['symbol'] = ticker
-        shares.append(df)
-        tickers_done.append(ticker)
-        time.sleep(1)
+    done = journal.done(project, "shares")
+
+    def append_shares(ticker, df):
+        df['date'] = df.index
+        journal.append(project, "shares", ticker,
+                       {"shares": df.to_dict("records")})
+
+    _, failures = fetcher.map(fetcher.shares,
+                              [a for a in tickers if a not in done],
+                              desc="shares",
+                              callback=append_shares)
+    report(failures, "shares")
 
     # save dataframe
-    df = pd.concat(shares)
-    df['date'] = df.index
-    df.to_csv(f"data/{project}/shares.csv", index=False)
+    for a, df in journal.compact(project, "shares").items():
+        storage.write(df, a, project, csv=export_csv)
+    journal.clear(project, "shares")
 
     # https://query1.finance.yahoo.com/ws/fundamentals-timeseries/v1/finance/timeseries/MSFT?symbol=MSFT&padTimeSeries=true&type=annualTreasurySharesNumber,trailingTreasurySharesNumber,annualPreferredSharesNumber,trailingPreferredSharesNumber,annualOrdinarySharesNumber,trailingOrdinarySharesNumber,annualShareIssued,trailingShareIssued,annualNetDebt,trailingNetDebt,annualTotalDebt,trailingTotalDebt,annualTangibleBookValue,trailingTangibleBookValue,annualInvestedCapital,trailingInvestedCapital,annualWorkingCapital,trailingWorkingCapital,annualNetTangibleAssets,trailingNetTangibleAssets,annualCapitalLeaseObligations,trailingCapitalLeaseObligations,annualCommonStockEquity,trailingCommonStockEquity,annualPreferredStockEquity,trailingPreferredStockEquity,annualTotalCapitalization,trailingTotalCapitalization,annualTotalEquityGrossMinorityInterest,trailingTotalEquityGrossMinorityInterest,annualMinorityInterest,trailingMinorityInterest,annualStockholdersEquity,trailingStockholdersEquity,annualOtherEquityInterest,trailingOtherEquityInterest,annualGainsLossesNotAffectingRetainedEarnings,trailingGainsLossesNotAffectingRetainedEarnings,annualOtherEquityAdjustments,trailingOtherEquityAdjustments,annualFixedAssetsRevaluationReserve,trailingFixedAssetsRevaluationReserve,annualForeignCurrencyTranslationAdjustments,trailingForeignCurrencyTranslationAdjustments,annualMinimumPensionLiabilities,trailingMinimumPensionLiabilities,annualUnrealizedGainLoss,trailingUnrealizedGainLoss,annualTreasuryStock,trailingTreasuryStock,annualRetainedEarnings,trailingRetainedEarnings,annualAdditionalPaidInCapital,trailingAdditionalPaidInCapital,annualCapitalStock,trailingCapitalStock,annualOtherCapitalStock,trailingOtherCapitalStock,annualCommonStock,trailingCommonStock,annualPreferredStock,trailingPreferredStock,annualTotalPartnershipCapital,trailingTotalPartnershipCapital,annualGeneralPartnershipCapital,trailingGeneralPartnershipCapital,annualLimitedPartnershipCapital,trailingLimitedPartnershipCapital,annualTotalLiabilitiesNetMinorityInterest,trailingTotalLiabilitiesNetMinorityInterest,annualTotalNonCurrentLiabilitiesNetMinorityInterest,trailingTotalNonCurrentLiabilitiesNetMinorityInterest,annualOtherNonCurrentLiabilities,trailingOtherNonCurrentLiabilities,annualLiabilitiesHeldforSaleNonCurrent,trailingLiabilitiesHeldforSaleNonCurrent,annualRestrictedCommonStock,trailingRestrictedCommonStock,annualPreferredSecuritiesOutsideStockEquity,trailingPreferredSecuritiesOutsideStockEquity,annualDerivativeProductLiabilities,trailingDerivativeProductLiabilities,annualEmployeeBenefits,trailingEmployeeBenefits,annualNonCurrentPensionAndOtherPostretirementBenefitPlans,trailingNonCurrentPensionAndOtherPostretirementBenefitPlans,annualNonCurrentAccruedExpenses,trailingNonCurrentAccruedExpenses,annualDuetoRelatedPartiesNonCurrent,trailingDuetoRelatedPartiesNonCurrent,annualTradeandOtherPayablesNonCurrent,trailingTradeandOtherPayablesNonCurrent,annualNonCurrentDeferredLiabilities,trailingNonCurrentDeferredLiabilities,annualNonCurrentDeferredRevenue,trailingNonCurrentDeferredRevenue,annualNonCurrentDeferredTaxesLiabilities,trailingNonCurrentDeferredTaxesLiabilities,annualLongTermDebtAndCapitalLeaseObligation,trailingLongTermDebtAndCapitalLeaseObligation,annualLongTermCapitalLeaseObligation,trailingLongTermCapitalLeaseObligation,annualLongTermDebt,trailingLongTermDebt,annualLongTermProvisions,trailingLongTermProvisions,annualCurrentLiabilities,trailingCurrentLiabilities,annualOtherCurrentLiabilities,trailingOtherCurrentLiabilities,annualCurrentDeferredLiabilities,trailingCurrentDeferredLiabilities,annualCurrentDeferredRevenue,trailingCurrentDeferredRevenue,annualCurrentDeferredTaxesLiabilities,trailingCurrentDeferredTaxesLiabilities,annualCurrentDebtAndCapitalLeaseObligation,trailingCurrentDebtAndCapitalLeaseObligation,annualCurrentCapitalLeaseObligation,trailingCurrentCapitalLeaseObligation,annualCurrentDebt,trailingCurrentDebt,annualOtherCurrentBorrowings,trailingOtherCurrentBorrowings,annualLineOfCredit,trailingLineOfCredit,annualCommercialPaper,trailingCommercialPaper,annualCurrentNotesPayable,trailingCurrentNotesPayable,annualPensionandOtherPostRetirementBenefitPlansCurrent,trailingPensionandOtherPostRetirementBenefitPlansCurrent,annualCurrentProvisions,trailingCurrentProvisions,annualPayablesAndAccruedExpenses,trailingPayablesAndAccruedExpenses,annualCurrentAccruedExpenses,trailingCurrentAccruedExpenses,annualInterestPayable,trailingInterestPayable,annualPayables,trailingPayables,annualOtherPayable,trailingOtherPayable,annualDuetoRelatedPartiesCurrent,trailingDuetoRelatedPartiesCurrent,annualDividendsPayable,trailingDividendsPayable,annualTotalTaxPayable,trailingTotalTaxPayable,annualIncomeTaxPayable,trailingIncomeTaxPayable,annualAccountsPayable,trailingAccountsPayable,annualTotalAssets,trailingTotalAssets,annualTotalNonCurrentAssets,trailingTotalNonCurrentAssets,annualOtherNonCurrentAssets,trailingOtherNonCurrentAssets,annualDefinedPensionBenefit,trailingDefinedPensionBenefit,annualNonCurrentPrepaidAssets,trailingNonCurrentPrepaidAssets,annualNonCurrentDeferredAssets,trailingNonCurrentDeferredAssets,annualNonCurrentDeferredTaxesAssets,trailingNonCurrentDeferredTaxesAssets,annualDuefromRelatedPartiesNonCurrent,trailingDuefromRelatedPartiesNonCurrent,annualNonCurrentNoteReceivables,trailingNonCurrentNoteReceivables,annualNonCurrentAccountsReceivable,trailingNonCurrentAccountsReceivable,annualFinancialAssets,trailingFinancialAssets,annualInvestmentsAndAdvances,trailingInvestmentsAndAdvances,annualOtherInvestments,trailingOtherInvestments,annualInvestmentinFinancialAssets,trailingInvestmentinFinancialAssets,annualHeldToMaturitySecurities,trailingHeldToMaturitySecurities,annualAvailableForSaleSecurities,trailingAvailableForSaleSecurities,annualFinancialAssetsDesignatedasFairValueThroughProfitorLossTotal,trailingFinancialAssetsDesignatedasFairValueThroughProfitorLossTotal,annualTradingSecurities,trailingTradingSecurities,annualLongTermEquityInvestment,trailingLongTermEquityInvestment,annualInvestmentsinJointVenturesatCost,trailingInvestmentsinJointVenturesatCost,annualInvestmentsInOtherVenturesUnderEquityMethod,trailingInvestmentsInOtherVenturesUnderEquityMethod,annualInvestmentsinAssociatesatCost,trailingInvestmentsinAssociatesatCost,annualInvestmentsinSubsidiariesatCost,trailingInvestmentsinSubsidiariesatCost,annualInvestmentProperties,trailingInvestmentProperties,annualGoodwillAndOtherIntangibleAssets,trailingGoodwillAndOtherIntangibleAssets,annualOtherIntangibleAssets,trailingOtherIntangibleAssets,annualGoodwill,trailingGoodwill,annualNetPPE,trailingNetPPE,annualAccumulatedDepreciation,trailingAccumulatedDepreciation,annualGrossPPE,trailingGrossPPE,annualLeases,trailingLeases,annualConstructionInProgress,trailingConstructionInProgress,annualOtherProperties,trailingOtherProperties,annualMachineryFurnitureEquipment,trailingMachineryFurnitureEquipment,annualBuildingsAndImprovements,trailingBuildingsAndImprovements,annualLandAndImprovements,trailingLandAndImprovements,annualProperties,trailingProperties,annualCurrentAssets,trailingCurrentAssets,annualOtherCurrentAssets,trailingOtherCurrentAssets,annualHedgingAssetsCurrent,trailingHedgingAssetsCurrent,annualAssetsHeldForSaleCurrent,trailingAssetsHeldForSaleCurrent,annualCurrentDeferredAssets,trailingCurrentDeferredAssets,annualCurrentDeferredTaxesAssets,trailingCurrentDeferredTaxesAssets,annualRestrictedCash,trailingRestrictedCash,annualPrepaidAssets,trailingPrepaidAssets,annualInventory,trailingInventory,annualInventoriesAdjustmentsAllowances,trailingInventoriesAdjustmentsAllowances,annualOtherInventories,trailingOtherInventories,annualFinishedGoods,trailingFinishedGoods,annualWorkInProcess,trailingWorkInProcess,annualRawMaterials,trailingRawMaterials,annualReceivables,trailingReceivables,annualReceivablesAdjustmentsAllowances,trailingReceivablesAdjustmentsAllowances,annualOtherReceivables,trailingOtherReceivables,annualDuefromRelatedPartiesCurrent,trailingDuefromRelatedPartiesCurrent,annualTaxesReceivable,trailingTaxesReceivable,annualAccruedInterestReceivable,trailingAccruedInterestReceivable,annualNotesReceivable,trailingNotesReceivable,annualLoansReceivable,trailingLoansReceivable,annualAccountsReceivable,trailingAccountsReceivable,annualAllowanceForDoubtfulAccountsReceivable,trailingAllowanceForDoubtfulAccountsReceivable,annualGrossAccountsReceivable,trailingGrossAccountsReceivable,annualCashCashEquivalentsAndShortTermInvestments,trailingCashCashEquivalentsAndShortTermInvestments,annualOtherShortTermInvestments,trailingOtherShortTermInvestments,annualCashAndCashEquivalents,trailingCashAndCashEquivalents,annualCashEquivalents,trailingCashEquivalents,annualCashFinancial,trailingCashFinancial&merge=false&period1=493590046&period2=1613490868
     # https://query1.finance.yahoo.com/v8/finance/chart/MSFT?symbol=MSFT&period1=1550725200&period2=1613491890&useYfid=true&interval=1d&events=div
@@ -1,70 +1,85 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import pandas as pd
 from sklearn.metrics import roc_auc_score, roc_curve
 import matplotlib.pyplot as plt
-from datetime import datetime
 import numpy as np
-from utils import process_data
+from config import BACKEND, DATE_TEST, DATE_VALID, FEATURES, TARGET
+from backends import make_backend
+from dataset import EncodedDataset, read_chunks
+from preprocessor import TabularPreprocessor
+from score import Scorer
+from search import load_best, split_params
 
 # seed
 np.random.seed(0)
 
-# Load data
-data = pd.read_csv(f"data/data_clean.csv")
-# Format date
-data['date'] = pd.to_datetime(data['date'])
+# Model backend
+backend = BACKEND
+
 # Define variables
-features = ['netIncome', 'grossProfit', 'ebit', 'totalRevenue', 'costOfRevenue', 'totalOtherIncomeExpenseNet', 'otherCurrentLiab', 'totalAssets', 'commonStock', 'otherLiab', 'otherAssets', 'cash', 'propertyPlantEquipment', 'accountsPayable', 'capitalSurplus', 'changeToLiabilities', 'totalCashflowsFromInvestingActivities', 'netBorrowings', 'totalCashFromFinancingActivities', 'changeInCash', 'totalCashFromOperatingActivities', 'depreciation', 'changeToNetincome', 'capitalExpenditures', 'changeToOperatingActivities', 'market_cap', 'div_percent', 'ebitAbs', 'totalRevenueAbs', 'yield', 'sector', 'outperform', 'positive' ]
-target = 'outperform_next'
+features = FEATURES
+target = TARGET
 
 # Date for validation and test sets
-# date_valid = datetime(year=2020, month=1, day=1)
-# date_test = datetime(year=2020, month=11, day=1)
-date_valid = datetime(year=2019, month=1, day=1)
-date_test = datetime(year=2020, month=6, day=1)
+date_valid = DATE_VALID
+date_test = DATE_TEST
+
+# Fit the preprocessing once on the train and valid chunks of data_clean,
+# it is saved with the model and the test rows are only transformed
+preprocessor = TabularPreprocessor(features, target).fit_chunks(
+    lambda: (chunk[chunk.date <= date_test]
+             for chunk in read_chunks("data_clean", features + [target, "date"])))
+
+# Encoded features stored once from chunks of data_clean, the splits are
+# row indices
+dataset = EncodedDataset.build("data_clean", preprocessor)
+splits = dataset.split(date_valid, date_test)
 
-# Process data and delcare model
-clf, X_train, y_train, X_valid, y_valid, X_test, y_test, _ = \
-    process_data(data, date_valid, date_test, features, target)
+# Parameters of the best trial of search.py, when it was run
+best = load_best() if backend == "tabnet" else None
+model_params, search_fit_params = split_params(best) if best else ({}, {})
+
+# Declare model
+clf = make_backend(backend, preprocessor.cat_idxs, preprocessor.cat_dims,
+                   **model_params)
 
 # Fuse train and validation sets and random shuffle
-X = np.append(X_train, X_valid, axis=0)
-y = np.append(y_train, y_valid, axis=0)
-indices = list(range(len(X)))
+indices = np.append(splits["train"], splits["valid"])
 np.random.shuffle(indices)
 n = int(np.floor(0.9*len(indices)))
 t, v = indices[:n], indices[n:]
-X_train, X_valid, y_train, y_valid = X[t], X[v], y[t], y[v]
-
-# Training
-clf.fit(X_train=X_train,
-        y_train=y_train,
-        eval_set=[(X_train, y_train), (X_valid, y_valid)],
-        eval_name=['train', 'valid'],
-        eval_metric=['auc'],
-        max_epochs=80,
-        patience=50,
-        batch_size=1024,
-        virtual_batch_size=128,
-        num_workers=0,
-        drop_last=False
-        )
+
+# Training, TabNet on mini-batches streamed from the memmap
+fit_params = dict(eval_metric=['auc'],
+                  max_epochs=80,
+                  patience=50,
+                  batch_size=1024,
+                  virtual_batch_size=128,
+                  num_workers=0,
+                  drop_last=False) if backend == "tabnet" else {}
+fit_params.update(search_fit_params)
+clf.fit_dataset(dataset, t,
+                eval_set=[t, v],
+                eval_name=['train', 'valid'],
+                **fit_params
+                )
 
 # save model
-saving_path_name = "models/model"
-saved_filepath = clf.save_model(saving_path_name)
-# clf = TabNetClassifier()
-# clf.load_model("models/model.zip")
-
-# Test
-test_auc = roc_auc_score(y_score=clf.predict_proba(X_test)[:, 1],
-                         y_true=y_test)
-valid_auc = roc_auc_score(y_score=clf.predict_proba(X_valid)[:, 1],
-                          y_true=y_valid)
-train_auc = roc_auc_score(y_score=clf.predict_proba(X_train)[:, 1],
-                          y_true=y_train)
+saving_path_name = "models/model" + clf.extension
+clf.save(saving_path_name)
+preprocessor.save("models/preprocessor.pkl")
+# scorer = Scorer.load()
+
+# Test, each split is scored once
+scorer = Scorer(clf, preprocessor)
+y_score = {name: scorer.predict(dataset.X, name, rows)
+           for name, rows in [('train', t), ('valid', v), ('test', splits["test"])]}
+y_train, y_valid, y_test = dataset.y[np.sort(t)], dataset.y[np.sort(v)], \
+    dataset.y[splits["test"]]
+test_auc = roc_auc_score(y_score=y_score['test'], y_true=y_test)
+valid_auc = roc_auc_score(y_score=y_score['valid'], y_true=y_valid)
+train_auc = roc_auc_score(y_score=y_score['train'], y_true=y_train)
 print("Testing AUC\n")
 print(f"BEST TRAIN SCORE: {train_auc}")
 print(f"BEST VALID SCORE: {valid_auc}")
@@ -73,12 +88,9 @@ print(f"BEST TEST SCORE: {test_auc}")
 # Plot roc curve
 fpr = dict()
 tpr = dict()
-fpr['train'], tpr['train'], _ = roc_curve(y_score=clf.predict_proba(X_train)[:, 1],
-                                          y_true=y_train)
-fpr['valid'], tpr['valid'], _ = roc_curve(y_score=clf.predict_proba(X_valid)[:, 1],
-                                          y_true=y_valid)
-fpr['test'], tpr['test'], _ = roc_curve(y_score=clf.predict_proba(X_test)[:, 1],
-                                        y_true=y_test)
+fpr['train'], tpr['train'], _ = roc_curve(y_score=y_score['train'], y_true=y_train)
+fpr['valid'], tpr['valid'], _ = roc_curve(y_score=y_score['valid'], y_true=y_valid)
+fpr['test'], tpr['test'], _ = roc_curve(y_score=y_score['test'], y_true=y_test)
 plt.figure()
 colors = ['aqua', 'darkorange', 'cornflowerblue']
 names = ['train', 'valid', 'test']
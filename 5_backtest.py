@@ -1,80 +1,50 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import pandas as pd
-from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
-from utils import process_data
+import storage
+from config import DATE_START, FEATURES, TARGET
+from probas import Probas
+from walkforward import WalkForward
 
-# Import prices
-prices_list = [pd.read_csv(f"data/sp500/prices_daily.csv"),
-               pd.read_csv(f"data/nyse/prices_daily.csv"),
-               pd.read_csv(f"data/nasdaq/prices_daily.csv")
-               ]
-for i in range(3):
-    prices_list[i]['Date'] = pd.to_datetime(prices_list[i]['Date'])
-    prices_list[i].set_index(['Date'], inplace=True)
-prices = prices_list[0]
-for i in range(1, 3):
-    cols_to_use = prices_list[i].columns.difference(prices.columns)
-    prices = pd.merge(prices,
-                      prices_list[i][cols_to_use],
-                      left_index=True,
-                      right_index=True,
-                      how='outer')
+# Number of windows trained in parallel
+workers = 4
+# Torch threads of each worker
+threads = 1
+# Retraining cadence (daily, monthly or quarterly), the windows between two
+# retrains are scored with the last model
+cadence = "quarterly"
+# Retrains fine-tuned from the previous model before a new model is trained
+# from scratch, the blocks of retrains being trained in parallel
+chain = 4
+fine_tune_epochs = 10
+# Model backend: tabnet, or hgb / logistic which retrain much faster and
+# are not fine-tuned
+backend = "tabnet"
+# Score of a symbol with several statements in a window: max, mean or last
+how = "max"
 
-# Load data
-data = pd.read_csv(f"data/data_clean.csv")
-# Format date
-data['date'] = pd.to_datetime(data['date'])
-# Define variables
-features = ['netIncome', 'grossProfit', 'ebit', 'totalRevenue', 'costOfRevenue', 'totalOtherIncomeExpenseNet', 'otherCurrentLiab', 'totalAssets', 'commonStock', 'otherLiab', 'otherAssets', 'cash', 'propertyPlantEquipment', 'accountsPayable', 'capitalSurplus', 'changeToLiabilities', 'totalCashflowsFromInvestingActivities', 'netBorrowings', 'totalCashFromFinancingActivities', 'changeInCash', 'totalCashFromOperatingActivities', 'depreciation', 'changeToNetincome', 'capitalExpenditures', 'changeToOperatingActivities', 'market_cap', 'div_percent', 'ebitAbs', 'totalRevenueAbs', 'yield', 'sector', 'outperform', 'positive' ]
-target = 'outperform_next'
+if __name__ == "__main__":
+    # Load data
+    data = storage.read("data_clean")
+    # Define variables
+    features = FEATURES
+    target = TARGET
 
-# Define dates
-date_start = datetime(year=2018, month=1, day=1)
-dates = list(set(data[data.date >= date_start]['date']))
-dates.sort()
-dates.append(max(dates) + relativedelta(years=10))
+    # Define dates
+    date_start = DATE_START
+    dates = list(set(data[data.date >= date_start]['date']))
+    dates.sort()
+    dates.append(max(dates) + relativedelta(years=10))
 
-all_probas = []
-for i in range(len(dates)-1):
-    date = dates[i]
-    date_next = dates[i+1]
-    print(f"{date} - {date_next}")
-    # Prepare model
-    date_train = date - relativedelta(years=1)
-    date_eval = date
-    clf, X_train, y_train, X_eval, y_eval, _, _, indices = \
-        process_data(data, date_train, date_eval, features, target)
-    sbl = data.symbol[indices == "valid"].tolist()
-    # Fit model
-    clf.fit(X_train=X_train,
-            y_train=y_train,
-            eval_set=[(X_train, y_train)],
-            eval_name=['train'],
-            eval_metric=['auc'],
-            max_epochs=50,
-            patience=0,
-            batch_size=1024,
-            virtual_batch_size=128,
-            num_workers=0,
-            drop_last=False,
-            )
-    # Get relevant symbols
-    prb = clf.predict_proba(X_eval)[:, 1]
-    order = (-prb).argsort()
-    symbols = {}
-    for i in order:
-        if sbl[i] not in symbols:
-            symbols[sbl[i]] = prb[i]
-    # Prices data for model testing
-    prices_period = prices[prices.index < date_next]
-    prices_period = prices_period[prices_period.index >= date]
-    prices_period[~prices_period.isnull()] = 0
-    prices_period.loc[:, symbols.keys()] = symbols.values()
-    all_probas.append(prices_period)
+    # Train the models of the windows not already in backtest/windows
+    engine = WalkForward(features, target, workers, threads, cadence, chain,
+                         fine_tune_epochs, backend)
+    for date in engine.run(data, dates[:-1]):
+        print(f"{date} done")
+    scores = engine.load(dates[:-1])
 
-probas = pd.concat(all_probas)
-probas.to_csv(f"backtest/probas.csv")
+    # Score of each symbol of a window, for the prices dated until the next
+    # date
+    Probas.from_scores(scores, dates, how).write()
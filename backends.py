@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+
+import numpy as np
+import torch
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from dataset import StreamingTabNetClassifier
+
+# Training parameters of each backend, given to fit
+FIT_PARAMS = {
+    "tabnet": dict(eval_metric=['auc'],
+                   max_epochs=50,
+                   patience=0,
+                   batch_size=1024,
+                   virtual_batch_size=128,
+                   num_workers=0,
+                   drop_last=False),
+    "hgb": {},
+    "logistic": {},
+}
+
+
+# Models share the interface of the TabNet classifier: fit on encoded
+# arrays (or on rows of an EncodedDataset), predict_proba, save and
+# feature_importances_. A backend with warm_start can be fine-tuned from the
+# weights of a previous fit.
+
+# TabNet, the model of the project
+class TabNetBackend(StreamingTabNetClassifier):
+
+    extension = ".zip"
+    warm_start = True
+
+    def save(self, path):
+        self.save_model(path[:-len(self.extension)])
+
+
+# Scikit-learn models fitted in memory on the encoded features
+class SklearnBackend:
+
+    extension = ".pkl"
+    warm_start = False
+
+    def __init__(self, cat_idxs, cat_dims, **params):
+        self.cat_idxs = list(cat_idxs)
+        self.cat_dims = list(cat_dims)
+        self.params = params
+        self.model = self.build(**params)
+
+    # Evaluation sets are only used by TabNet for its training logs
+    def fit(self, X_train, y_train, eval_set=None, eval_name=None,
+            warm_start=False):
+        self.model.fit(X_train, y_train)
+        return self
+
+    def fit_dataset(self, dataset, train, eval_set=(), eval_name=None, **params):
+        rows = np.sort(train)
+        return self.fit(np.asarray(dataset.X[rows]), np.asarray(dataset.y[rows]),
+                        **params)
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+
+# Histogram gradient boosting, categorical features being split natively
+# when they have few enough categories
+class GradientBoostingBackend(SklearnBackend):
+
+    def build(self, max_iter=200, learning_rate=0.05, max_leaf_nodes=31,
+              l2_regularization=1.0, random_state=0):
+        categorical = [i for i, dim in zip(self.cat_idxs, self.cat_dims) if dim <= 255]
+        return HistGradientBoostingClassifier(
+            max_iter=max_iter, learning_rate=learning_rate,
+            max_leaf_nodes=max_leaf_nodes, l2_regularization=l2_regularization,
+            categorical_features=categorical or None, early_stopping=False,
+            random_state=random_state)
+
+    # A sample of the training rows is kept by fit for the importances
+    def fit(self, X_train, y_train, eval_set=None, eval_name=None,
+            warm_start=False, importance_rows=5000):
+        super().fit(X_train, y_train)
+        rows = np.random.default_rng(0).permutation(len(X_train))[:importance_rows]
+        self.importance_sample = (np.asarray(X_train[rows], dtype=np.float32),
+                                  y_train[rows])
+        self.importances = None
+        return self
+
+    # Permutation importances on the AUC of the sample of the training rows,
+    # computed on the first access only
+    @property
+    def feature_importances_(self):
+        if self.importances is None:
+            X, y = self.importance_sample
+            scoring = "roc_auc" if len(np.unique(y)) > 1 else None
+            result = permutation_importance(self.model, X, y, scoring=scoring,
+                                            n_repeats=3, random_state=0)
+            self.importances = np.clip(result.importances_mean, 0, None)
+            self.importance_sample = None
+        return self.importances / max(self.importances.sum(), 1e-12)
+
+
+# L2 regularized logistic regression, with one-hot encoded categorical
+# features
+class LogisticBackend(SklearnBackend):
+
+    def build(self, C=1.0, max_iter=1000):
+        encoder = ColumnTransformer([("categories",
+                                      OneHotEncoder(handle_unknown="ignore"),
+                                      self.cat_idxs)],
+                                    remainder="passthrough")
+        return make_pipeline(encoder, LogisticRegression(C=C, max_iter=max_iter))
+
+    # Absolute coefficients summed by feature
+    @property
+    def feature_importances_(self):
+        encoder, logistic = self.model[0], self.model[-1]
+        coefficients = np.abs(logistic.coef_[0])
+        importances = np.zeros(encoder.n_features_in_)
+        # Output columns: the one-hot columns of each categorical feature,
+        # then the other features in order
+        position = 0
+        for i, categories in zip(self.cat_idxs,
+                                 encoder.named_transformers_["categories"].categories_):
+            importances[i] = coefficients[position:position + len(categories)].sum()
+            position += len(categories)
+        others = [i for i in range(encoder.n_features_in_) if i not in self.cat_idxs]
+        importances[others] = coefficients[position:]
+        return importances / max(importances.sum(), 1e-12)
+
+
+BACKENDS = {"tabnet": TabNetBackend,
+            "hgb": GradientBoostingBackend,
+            "logistic": LogisticBackend}
+
+
+# Model of the project, given the categorical features. Other TabNet
+# parameters (n_d, n_a, n_steps...) can be given, for instance by search.py.
+def make_classifier(cat_idxs, cat_dims, cls=TabNetBackend, lr=1e-2,
+                    step_size=10, gamma=0.9, cat_emb_dim=1, mask_type='entmax',
+                    **params):
+    return cls(cat_idxs=cat_idxs,
+               cat_dims=cat_dims,
+               cat_emb_dim=cat_emb_dim,
+               optimizer_fn=torch.optim.Adam,
+               optimizer_params=dict(lr=lr),
+               scheduler_params={"step_size": step_size,
+                                 "gamma": gamma},
+               scheduler_fn=torch.optim.lr_scheduler.StepLR,
+               mask_type=mask_type,
+               **params
+               )
+
+
+def make_backend(name, cat_idxs, cat_dims, **params):
+    if name == "tabnet":
+        return make_classifier(cat_idxs, cat_dims, TabNetBackend, **params)
+    return BACKENDS[name](cat_idxs, cat_dims, **params)
+
+
+# Model saved with the extension of its backend, the latest one when models
+# of several backends exist
+def saved_model(prefix="models/model"):
+    paths = [prefix + cls.extension for cls in BACKENDS.values()
+             if os.path.exists(prefix + cls.extension)]
+    if not paths:
+        raise FileNotFoundError(f"No model saved as {prefix}.*")
+    return max(paths, key=os.path.getmtime)
+
+
+# Model saved by a backend, from the extension of its path
+def load(path):
+    if path.endswith(TabNetBackend.extension):
+        clf = TabNetBackend()
+        clf.load_model(path)
+        return clf
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# Model saved at path, to be fine-tuned with the optimizer and the scheduler
+# of clf. load_model only restores the network, without the scheduler.
+def load_warm(path, clf):
+    warm = load(path)
+    for name in ["optimizer_fn", "optimizer_params", "scheduler_fn",
+                 "scheduler_params"]:
+        setattr(warm, name, getattr(clf, name))
+    return warm
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import platform
+
+import numpy as np
+import pandas as pd
+
+
+# Versions and machine the results were measured on
+def environment():
+    return {"python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+
+
+def save(results, params, path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"params": params, "environment": environment(),
+                   "results": results}, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Results against a baseline: ratios of the best time and of the peak memory,
+# a benchmark being flagged when a ratio exceeds 1 + threshold
+def compare(results, baseline=None, threshold=0.2):
+    rows = []
+    reference = {} if baseline is None else baseline["results"]
+    for name, result in results.items():
+        row = {"benchmark": name, "time (s)": result["best"],
+               "median (s)": result["median"], "peak (MB)": result["peak"]}
+        base = reference.get(name)
+        if base is not None:
+            row["base time (s)"] = base["best"]
+            row["time ratio"] = result["best"] / base["best"]
+            row["base peak (MB)"] = base["peak"]
+            row["peak ratio"] = result["peak"] / max(base["peak"], 1e-9)
+            if max(row["time ratio"], row["peak ratio"]) > 1 + threshold:
+                row["status"] = "regression"
+            elif min(row["time ratio"], row["peak ratio"]) < 1 - threshold:
+                row["status"] = "improvement"
+            else:
+                row["status"] = "ok"
+        else:
+            row["status"] = "new"
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("benchmark")
+
+
+def show(table, params, baseline=None):
+    if baseline is not None and baseline["params"] != params:
+        print(f"Warning: the baseline was measured with {baseline['params']}")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(table.round(3).astype(object).fillna("").to_string())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import contextlib
+import gc
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import ROOT, report, synthetic
+import simulator
+import storage
+import walkforward
+import weighting
+from config import FEATURES, PROJECTS, REF_INDEX, TARGET
+from preprocess import build_shared, preprocess
+from preprocessor import TabularPreprocessor
+from price_matrix import PriceMatrix
+from probas import Probas
+from utils import process_data
+
+
+# Dates of the clean dataset at 70% and 85% of its rows, the validation and
+# test dates of process_data whatever the years of the synthetic data
+def _split_dates(data):
+    dates = np.sort(data.date.values)
+    return pd.Timestamp(dates[int(0.7 * len(dates))]), \
+        pd.Timestamp(dates[int(0.85 * len(dates))])
+
+
+# Joins of 2_preprocess_data.py: shared matrices, asof merges of the prices,
+# dividends and shares of each project, then the merge of the projects
+def preprocessing(options):
+    def run():
+        build_shared(PROJECTS)
+        for project in PROJECTS:
+            preprocess(project, REF_INDEX, incremental=False)
+        data = pd.concat([storage.read("data", project) for project in PROJECTS])
+        storage.write(data.drop_duplicates().reset_index(drop=True), "data")
+    return run
+
+
+# The 3_feature_eng.py script, from data to data_clean and data_evol_clean
+def feature_engineering(options):
+    script = os.path.join(ROOT, "3_feature_eng.py")
+    return lambda: runpy.run_path(script, run_name="__main__")
+
+
+def processing(options):
+    data = storage.read("data_clean")
+    date_valid, date_test = _split_dates(data)
+    return lambda: process_data(data, date_valid, date_test, FEATURES, TARGET,
+                                backend=options.backend)
+
+
+# One retrain of the walk-forward backtest at the test date and the scores
+# of the windows until the next quarterly retrain. The model and the scores
+# are removed first so that each run trains again.
+def walk_forward_step(options):
+    data = storage.read("data_clean")
+    _, date = _split_dates(data)
+    engine = walkforward.WalkForward(FEATURES, TARGET, cadence="quarterly",
+                                     backend=options.backend)
+    engine.done()
+    schedule = engine.schedule(sorted(set(data.date[data.date >= date])))
+    date, windows = next(iter(schedule.items()))
+    preprocessor = TabularPreprocessor(FEATURES, TARGET).fit(data[data.date <= date])
+    walkforward._worker["data"] = data
+
+    def run():
+        for path in [engine.model_path(date)] + [engine.path(a) for a in windows]:
+            if os.path.exists(path):
+                os.remove(path)
+        walkforward.fit_block(engine, [(date, preprocessor, windows)])
+    return run
+
+
+# Strategies of 6_strategies.py on monthly windows of random scores of all
+# the tickers: dense probas, softmax and top 100 weights, sweep of the
+# portfolio sizes and rebalancing simulation
+def strategy_weighting(options):
+    prices = PriceMatrix.build(PROJECTS)
+    rng = np.random.default_rng(options.seed)
+    starts = prices.dates[~prices.dates.to_period("M").duplicated()]
+    ends = starts[1:].append(pd.DatetimeIndex([prices.dates[-1] + pd.Timedelta(days=1)]))
+    tickers = len(prices.tickers)
+    probas = Probas(pd.DataFrame({"date_start": np.repeat(starts, tickers),
+                                  "date_end": np.repeat(ends, tickers),
+                                  "symbol": np.tile(prices.tickers, len(starts)),
+                                  "proba": rng.random(len(starts) * tickers)}))
+
+    def run():
+        scores = probas.frame(prices)
+        returns = prices.frame().pct_change()
+        for weights in [weighting.softmax(scores), weighting.top_n(scores, 100)]:
+            weighting.cumulative(weighting.portfolio_returns(returns, weights))
+        weighting.sweep_top_n(scores, returns, range(1, 2001))
+        simulator.simulate(weighting.top_n(scores, 100), returns, "monthly",
+                           cost=0.001, slippage=0.0005)
+    return run
+
+
+# Benchmarks with the benchmarks whose outputs they read. A dependency not
+# selected is run once without being measured.
+BENCHMARKS = {
+    "preprocessing": {"setup": preprocessing, "deps": []},
+    "feature_engineering": {"setup": feature_engineering, "deps": ["preprocessing"]},
+    "process_data": {"setup": processing, "deps": ["feature_engineering"]},
+    "walk_forward_step": {"setup": walk_forward_step, "deps": ["feature_engineering"]},
+    "strategy_weighting": {"setup": strategy_weighting, "deps": []},
+}
+
+
+def plan(names):
+    order = []
+
+    def visit(name):
+        for dep in BENCHMARKS[name]["deps"]:
+            visit(dep)
+        if name not in order:
+            order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+# Wall times of repeated runs, then the peak of the memory allocated by
+# python and numpy during one more run traced by tracemalloc
+def measure(run, repeat=3):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"best": min(times), "median": float(np.median(times)),
+            "times": times, "peak": peak / 2 ** 20}
+
+
+# Run the benchmarks on synthetic stores written in workdir, a temporary
+# folder by default. The scripts read and write their data relative to the
+# working directory, which is changed for the run.
+def run(names, options, workdir=None):
+    temporary = workdir is None
+    workdir = tempfile.mkdtemp(prefix="benchmarks-") if temporary else workdir
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+    results = {}
+    os.chdir(workdir)
+    try:
+        synthetic.generate("data", options.tickers, options.years, seed=options.seed)
+        for name in plan(names):
+            print(f"Running {name}", flush=True)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                benchmark = BENCHMARKS[name]["setup"](options)
+                if name in names:
+                    results[name] = measure(benchmark, options.repeat)
+                else:
+                    benchmark()
+    finally:
+        os.chdir(cwd)
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data")
+    parser.add_argument("benchmarks", nargs="*",
+                        help=f"benchmarks to run among {', '.join(BENCHMARKS)}, "
+                        "all by default")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default="hgb",
+                        help="model of process_data and of the walk-forward step")
+    parser.add_argument("--workdir", help="keep the synthetic data and outputs there")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--output", help="also store the results in this file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change of time or memory reported")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error on a regression")
+    args = parser.parse_args()
+    unknown = [a for a in args.benchmarks if a not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks {unknown}")
+
+    params = {"tickers": args.tickers, "years": args.years, "seed": args.seed,
+              "backend": args.backend}
+    results = run(args.benchmarks or list(BENCHMARKS), args, args.workdir)
+    baseline = report.load(args.baseline) if os.path.exists(args.baseline) else None
+    table = report.compare(results, baseline, args.threshold)
+    report.show(table, params, baseline)
+    if args.output:
+        report.save(results, params, args.output)
+    if args.save_baseline:
+        report.save(results, params, args.baseline)
+        print(f"Baseline saved in {args.baseline}")
+    if args.check and (table.status == "regression").any():
+        sys.exit(1)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+from config import PROJECTS, REF_INDEXES
+
+# Statement columns of each dataset as (share of missing values, median
+# ratio to the total revenue), observed in data/sp500/data.csv
+STATEMENTS = {
+    "incomeStatementHistory": {
+        "researchDevelopment": (0.66, 0.0745),
+        "effectOfAccountingCharges": (1.0, 0.0),
+        "incomeBeforeTax": (0.0, 0.135),
+        "minorityInterest": (0.43, 0.0111),
+        "netIncome": (0.0, 0.111),
+        "sellingGeneralAdministrative": (0.02, 0.17),
+        "grossProfit": (0.0, 0.444),
+        "ebit": (0.0, 0.158),
+        "operatingIncome": (0.0, 0.17),
+        "otherOperatingExpenses": (0.61, 0.0147),
+        "interestExpense": (0.09, -0.0188),
+        "extraordinaryItems": (1.0, 0.0),
+        "nonRecurring": (1.0, 0.0),
+        "otherItems": (1.0, 0.0),
+        "incomeTaxExpense": (0.0, 0.0229),
+        "totalRevenue": (0.0, 1.0),
+        "totalOperatingExpenses": (0.0, 0.83),
+        "costOfRevenue": (0.0, 0.556),
+        "totalOtherIncomeExpenseNet": (0.0, -0.0218),
+        "discontinuedOperations": (0.83, 0.000154),
+        "netIncomeFromContinuingOps": (0.0, 0.11),
+        "netIncomeApplicableToCommonShares": (0.0, 0.11),
+    },
+    "balanceSheetHistory": {
+        "intangibleAssets": (0.12, 0.107),
+        "capitalSurplus": (0.15, 0.454),
+        "totalLiab": (0.0, 1.16),
+        "totalStockholderEquity": (0.0, 0.724),
+        "otherCurrentLiab": (0.05, 0.075),
+        "totalAssets": (0.0, 1.93),
+        "commonStock": (0.05, 0.000854),
+        "otherCurrentAssets": (0.09, 0.027),
+        "retainedEarnings": (0.05, 0.518),
+        "otherLiab": (0.01, 0.177),
+        "goodWill": (0.1, 0.288),
+        "treasuryStock": (0.01, -0.147),
+        "otherAssets": (0.01, 0.0736),
+        "cash": (0.0, 0.111),
+        "totalCurrentLiabilities": (0.0, 0.317),
+        "deferredLongTermAssetCharges": (0.4, 0.018),
+        "otherStockholderEquity": (0.02, -0.0241),
+        "propertyPlantEquipment": (0.01, 0.225),
+        "totalCurrentAssets": (0.0, 0.479),
+        "longTermInvestments": (0.25, 0.0434),
+        "netTangibleAssets": (0.0, 0.153),
+        "netReceivables": (0.04, 0.154),
+        "longTermDebt": (0.05, 0.509),
+        "inventory": (0.26, 0.095),
+        "accountsPayable": (0.01, 0.0817),
+        "minorityInterest": (0.45, 0.0111),
+        "shortLongTermDebt": (0.31, 0.0314),
+        "shortTermInvestments": (0.59, 0.0518),
+        "deferredLongTermLiab": (0.74, 0.0262),
+        "investments": (0.26, -0.00199),
+    },
+    "cashflowStatementHistory": {
+        "changeToLiabilities": (0.0, 0.00436),
+        "totalCashflowsFromInvestingActivities": (0.0, -0.0802),
+        "netBorrowings": (0.03, 0.00776),
+        "totalCashFromFinancingActivities": (0.0, -0.0613),
+        "changeToOperatingActivities": (0.03, -0.00173),
+        "issuanceOfStock": (0.24, 0.00788),
+        "netIncome": (0.0, 0.111),
+        "changeInCash": (0.0, 0.00787),
+        "repurchaseOfStock": (0.13, -0.0459),
+        "effectOfExchangeRate": (0.29, 4.23e-05),
+        "totalCashFromOperatingActivities": (0.0, 0.193),
+        "depreciation": (0.0, 0.0482),
+        "otherCashflowsFromInvestingActivities": (0.19, -3.29e-06),
+        "dividendsPaid": (0.18, -0.0493),
+        "changeToInventory": (0.35, -0.00351),
+        "changeToAccountReceivables": (0.11, -0.0062),
+        "otherCashflowsFromFinancingActivities": (0.06, -0.00221),
+        "changeToNetincome": (0.0, 0.0164),
+        "capitalExpenditures": (0.07, -0.0381),
+    },
+}
+# Months of the fiscal year ends and their frequencies
+FISCAL_MONTHS = {12: 0.758, 9: 0.047, 6: 0.045, 1: 0.026, 2: 0.022, 10: 0.021,
+                 3: 0.021, 5: 0.018, 11: 0.013, 4: 0.01, 7: 0.009, 8: 0.008}
+# Sectors of the nyse and nasdaq lists, and of the S&P 500 list
+SECTORS = {"Finance": 0.27, "Health Care": 0.16, "Consumer Services": 0.14,
+           "Technology": 0.11, "Capital Goods": 0.07, "Basic Industries": 0.05,
+           "Energy": 0.04, "Public Utilities": 0.04, "Consumer Non-Durables": 0.04,
+           "Consumer Durables": 0.025, "Miscellaneous": 0.025,
+           "Transportation": 0.02}
+SP500_SECTORS = {"Industrials": 0.147, "Information Technology": 0.147,
+                 "Financials": 0.129, "Health Care": 0.125,
+                 "Consumer Discretionary": 0.121, "Consumer Staples": 0.063,
+                 "Real Estate": 0.059, "Utilities": 0.055, "Materials": 0.055,
+                 "Communication Services": 0.051, "Energy": 0.048}
+# Share of the tickers stored in each project. A ticker is only downloaded
+# in the first project listing it, the S&P 500 companies being also listed
+# in the nyse or nasdaq lists.
+PROJECT_SHARES = {"sp500": 0.07, "nyse": 0.4, "nasdaq": 0.53}
+
+
+def _choice(rng, frequencies, size):
+    keys = list(frequencies)
+    p = np.array([frequencies[a] for a in keys], dtype=float)
+    return np.array(keys)[rng.choice(len(keys), size, p=p / p.sum())]
+
+
+# Daily adjusted prices of the tickers (dates x tickers) from a market
+# factor, NaN outside of the listing of each ticker and on a few missing
+# days, and the prices of the reference indexes
+def _prices(rng, dates, tickers, listed, delisting, missing):
+    days, n = len(dates), len(tickers)
+    market = rng.normal(0.0003, 0.011, days)
+    beta = rng.normal(1.0, 0.3, n)
+    volatility = np.exp(rng.normal(np.log(0.02), 0.4, n))
+    log_prices = np.empty((days, n))
+    log_prices[0] = rng.normal(4.36, 0.89, n)
+    log_prices[1:] = (market[1:, None] * beta
+                      + rng.standard_normal((days - 1, n)) * volatility)
+    log_prices = np.cumsum(log_prices, axis=0)
+    # Listing period of each ticker: listed before the first date or
+    # introduced during the period, and delisted at a yearly rate
+    first = np.where(rng.random(n) < listed, 0, rng.integers(0, days, n))
+    life = rng.exponential(252 / max(delisting, 1e-9), n).astype(np.int64)
+    last = np.minimum(first + life, days)
+    rows = np.arange(days)[:, None]
+    alive = (rows >= first) & (rows < last)
+    prices = np.where(alive & (rng.random((days, n)) >= missing),
+                      np.exp(log_prices), np.nan)
+    indexes = np.exp(np.log(3000.0) + np.cumsum(market)[:, None]
+                     * np.array([1.0, 1.2]))
+    return prices, indexes, first, last
+
+
+# Quarterly dividends of the paying tickers, a dividend yield of about 2%
+def _dividends(rng, prices, payers):
+    days, n = prices.shape
+    dividends = np.full((days, n), np.nan)
+    paying = np.flatnonzero(rng.random(n) < payers)
+    yields = np.exp(rng.normal(np.log(0.02), 0.5, len(paying)))
+    # Paid every 63 business days from an offset of each ticker
+    offsets = rng.integers(0, 63, len(paying))
+    paid = (np.arange(days)[:, None] - offsets) % 63 == 0
+    dividends[:, paying] = np.where(paid, prices[:, paying] * yields / 4, np.nan)
+    return dividends
+
+
+# Yearly statements of the tickers at their fiscal year ends while listed:
+# one frame per statement dataset and the shares. Some rows of each dataset
+# are missing, so that the datasets do not join on all the rows.
+def _statements(rng, dates, tickers, first, last, gaps):
+    months = _choice(rng, FISCAL_MONTHS, len(tickers))
+    ends = pd.date_range(dates[0], dates[-1], freq="ME")
+    rows = []
+    for ticker, month, a, b in zip(tickers, months, first, last):
+        for date in ends[(ends.month == month)
+                         & (ends >= dates[a]) & (ends <= dates[b - 1])]:
+            rows.append((date, ticker))
+    base = pd.DataFrame(rows, columns=["date", "symbol"])
+    # Revenue of a company growing from year to year
+    size = pd.Series(rng.normal(23.0, 1.2, len(tickers)), index=tickers)
+    growth = rng.normal(0.05, 0.15, len(base))
+    revenue = np.exp(size[base.symbol].values
+                     + pd.Series(growth).groupby(base.symbol.values).cumsum().values)
+    frames = {}
+    for dataset, columns in STATEMENTS.items():
+        df = base.copy()
+        for column, (missing, ratio) in columns.items():
+            noise = np.exp(rng.normal(0.0, 0.3, len(df)))
+            values = revenue * ratio * noise
+            values[rng.random(len(df)) < missing] = np.nan
+            df[column] = values
+        frames[dataset] = df[rng.random(len(df)) >= gaps].reset_index(drop=True)
+    shares = base.copy()
+    shares["annualOrdinarySharesNumber"] = np.round(
+        revenue * 0.0357 * np.exp(rng.normal(0.0, 0.5, len(base))))
+    shares["annualPreferredSharesNumber"] = np.where(
+        rng.random(len(base)) < 0.03, np.round(revenue * 0.001), np.nan)
+    frames["shares"] = shares[rng.random(len(shares)) >= gaps].reset_index(drop=True)
+    return frames
+
+
+# Deterministic synthetic stores of the projects in root, shaped as the
+# outputs of 1_get_data.py: wide prices and dividends with the reference
+# indexes, statements, shares and the list of the companies of each
+# project. Scale with the number of tickers and of years up to end.
+def generate(root="data", tickers=500, years=8, end="2021-12-31", seed=0,
+             projects=PROJECTS, ref_indexes=REF_INDEXES, listed=0.8,
+             delisting=0.03, missing=0.001, payers=0.8, gaps=0.02):
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end)
+    dates = pd.bdate_range(end - pd.DateOffset(years=years), end, name="Date")
+    symbols = np.array([f"S{i:05d}" for i in range(tickers)])
+    shares = np.array([PROJECT_SHARES.get(a, 1.0) for a in projects])
+    owners = rng.choice(len(projects), tickers, p=shares / shares.sum())
+    sp500 = projects.index("sp500") if "sp500" in projects else -1
+    others = [i for i in range(len(projects)) if i != sp500] or [0]
+    exchanges = rng.choice(others, tickers)
+
+    prices, indexes, first, last = _prices(rng, dates, symbols, listed,
+                                           delisting, missing)
+    dividends = _dividends(rng, prices, payers)
+    statements = _statements(rng, dates, symbols, first, last, gaps)
+    sectors = _choice(rng, SECTORS, tickers)
+    sp500_sectors = _choice(rng, SP500_SECTORS, tickers)
+    index_columns = list(ref_indexes)[:indexes.shape[1]]
+
+    for i, project in enumerate(projects):
+        os.makedirs(os.path.join(root, project), exist_ok=True)
+        columns = np.flatnonzero(owners == i)
+        own = set(symbols[columns])
+        wide = {"prices_daily": prices, "dividends": dividends}
+        for dataset, values in wide.items():
+            df = pd.DataFrame(values[:, columns], index=dates,
+                              columns=symbols[columns])
+            for j, name in enumerate(index_columns):
+                df[name] = indexes[:, j] if dataset == "prices_daily" else np.nan
+            storage.write(df.sort_index(axis=1), dataset, project, root)
+        for dataset, df in statements.items():
+            storage.write(df[df.symbol.isin(own)], dataset, project, root)
+        # The list of an exchange also holds the S&P 500 companies it trades
+        listing = np.flatnonzero((owners == i) | ((owners == sp500)
+                                                  & (exchanges == i)))
+        pd.DataFrame({"Symbol": symbols[listing],
+                      "Sector": (sp500_sectors if project == "sp500"
+                                 else sectors)[listing]}) \
+            .to_csv(os.path.join(root, project, f"{project}.csv"), index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic project stores")
+    parser.add_argument("root", help="data folder to write, not the data of the project")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=8)
+    parser.add_argument("--end", default="2021-12-31")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.root, args.tickers, args.years, args.end, args.seed)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from features import MODEL_FEATURES
+
+# Modify projects and reference indexes according to your needs
+PROJECTS = ["sp500", "nyse", "nasdaq"]
+# Indexes downloaded with the prices
+REF_INDEXES = ["^GSPC", "^IXIC"]
+# Index the yields are compared to
+REF_INDEX = "^IXIC"
+
+# Model variables
+FEATURES = MODEL_FEATURES
+TARGET = 'outperform_next'
+# Model backend of 4_model.py: tabnet, or hgb / logistic which train much
+# faster
+BACKEND = "tabnet"
+
+# Date for validation and test sets
+# DATE_VALID = datetime(year=2020, month=1, day=1)
+# DATE_TEST = datetime(year=2020, month=11, day=1)
+DATE_VALID = datetime(year=2019, month=1, day=1)
+DATE_TEST = datetime(year=2020, month=6, day=1)
+
+# First date of the backtest
+DATE_START = datetime(year=2018, month=1, day=1)
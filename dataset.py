@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import torch
+from pytorch_tabnet.tab_model import TabNetClassifier
+
+import storage
+
+
+# Chunks of rows of some columns of a stored dataset, read by row groups
+def read_chunks(dataset, columns, chunk_size=100000, root="data"):
+    file = pq.ParquetFile(storage.path(dataset, None, root))
+    columns = list(dict.fromkeys(columns))
+    for batch in file.iter_batches(chunk_size, columns=columns):
+        yield storage.apply_schema(batch.to_pandas(), dataset)
+
+
+# Encoded feature matrix of a dataset, stored once as a contiguous float32
+# memmap with its target and dates. Splits are arrays of row indices, and
+# the rows are only read batch by batch.
+class EncodedDataset:
+
+    def __init__(self, X, y, dates):
+        self.X = X
+        self.y = y
+        self.dates = dates
+
+    def __len__(self):
+        return len(self.X)
+
+    # Encode a dataframe, or a stored dataset read by row groups, in chunks
+    # of rows with a fitted preprocessor
+    @classmethod
+    def build(cls, data, preprocessor, path="data/encoded", chunk_size=100000):
+        if isinstance(data, str):
+            rows = pq.ParquetFile(storage.path(data)).metadata.num_rows
+            chunks = read_chunks(data, preprocessor.columns + ['date'], chunk_size)
+        else:
+            rows = len(data)
+            chunks = (data.iloc[a:a + chunk_size] for a in range(0, rows, chunk_size))
+        os.makedirs(path, exist_ok=True)
+        X = np.lib.format.open_memmap(os.path.join(path, "X.npy"), mode="w+",
+                                      dtype=np.float32,
+                                      shape=(rows, len(preprocessor.features)))
+        y = np.lib.format.open_memmap(os.path.join(path, "y.npy"), mode="w+",
+                                      dtype=np.float32, shape=(rows,))
+        dates = np.lib.format.open_memmap(os.path.join(path, "dates.npy"),
+                                          mode="w+", dtype="datetime64[D]",
+                                          shape=(rows,))
+        start = 0
+        for chunk in chunks:
+            end = start + len(chunk)
+            X[start:end] = preprocessor.transform(chunk)
+            y[start:end] = preprocessor.transform_target(chunk)
+            dates[start:end] = chunk.date.to_numpy(dtype="datetime64[D]")
+            start = end
+        for a in [X, y, dates]:
+            a.flush()
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path="data/encoded", mmap_mode="r"):
+        return cls(*[np.load(os.path.join(path, f"{a}.npy"), mmap_mode=mmap_mode)
+                     for a in ["X", "y", "dates"]])
+
+    # Row indices of the train (up to date_valid), valid (up to date_test)
+    # and test sets, as split by utils.process_data
+    def split(self, date_valid, date_test):
+        dates = np.asarray(self.dates)
+        valid = dates > np.datetime64(pd.Timestamp(date_valid), "D")
+        test = dates > np.datetime64(pd.Timestamp(date_test), "D")
+        return {"train": np.flatnonzero(~valid),
+                "valid": np.flatnonzero(valid & ~test),
+                "test": np.flatnonzero(test)}
+
+    def batches(self, indices, batch_size=1024, shuffle=False, drop_last=False,
+                seed=None, classes=None):
+        return BatchLoader(self, indices, batch_size, shuffle, drop_last, seed,
+                           classes)
+
+
+# Mini-batches of (X, y) tensors over rows of a dataset, iterated again on
+# each epoch, in a new random order when shuffled. The rows of a batch are
+# read in increasing order from the memmap.
+class BatchLoader:
+
+    def __init__(self, dataset, indices, batch_size=1024, shuffle=False,
+                 drop_last=False, seed=None, classes=None):
+        self.dataset = dataset
+        self.indices = np.asarray(indices)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.rng = np.random.default_rng(seed)
+        # Labels mapped to class positions, as the model expects them
+        self.classes = classes
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.indices) // self.batch_size
+        return -(-len(self.indices) // self.batch_size)
+
+    def __iter__(self):
+        indices = self.rng.permutation(self.indices) if self.shuffle else self.indices
+        for i in range(len(self)):
+            rows = np.sort(indices[i * self.batch_size:(i + 1) * self.batch_size])
+            X = self.dataset.X[rows]
+            y = self.dataset.y[rows]
+            if self.classes is not None:
+                y = np.searchsorted(self.classes, y)
+            yield torch.from_numpy(np.asarray(X)), torch.from_numpy(np.asarray(y))
+
+
+# TabNet fitted on row indices of an EncodedDataset through streaming
+# loaders, without materializing the split matrices. fit still trains on
+# arrays.
+#
+# TabModel.fit (pytorch_tabnet 4.1, pinned in requirements.txt) has no
+# public hook for the loaders: it checks the arrays it is given, infers the
+# classes from y_train and the eval labels, builds the loaders with
+# _construct_loaders and computes the importances on X_train with
+# _compute_feature_importances. fit_dataset therefore gives fit the first
+# train row and the distinct labels, enough for the checks and the classes,
+# and both private methods are overridden to read the rows of the dataset
+# instead while _stream is set. Check them again when upgrading.
+class StreamingTabNetClassifier(TabNetClassifier):
+
+    _stream = None
+
+    def fit_dataset(self, dataset, train, eval_set=(), eval_name=None, seed=0,
+                    **params):
+        self._stream = (dataset, train, list(eval_set), seed)
+        # Only the shapes and labels of the arrays given to fit are used
+        head = np.sort(train[:1])
+        try:
+            return self.fit(X_train=dataset.X[head],
+                            y_train=np.unique(dataset.y[train]),
+                            eval_set=[(dataset.X[head], np.unique(dataset.y[a])[:1])
+                                      for a in eval_set],
+                            eval_name=eval_name,
+                            **params)
+        finally:
+            self._stream = None
+
+    def _construct_loaders(self, X_train, y_train, eval_set):
+        if self._stream is None:
+            return super()._construct_loaders(X_train, y_train, eval_set)
+        dataset, train, eval_indices, seed = self._stream
+        train_loader = dataset.batches(train, self.batch_size, shuffle=True,
+                                       drop_last=self.drop_last, seed=seed,
+                                       classes=self.classes_)
+        valid_loaders = [dataset.batches(a, self.batch_size, classes=self.classes_)
+                         for a in eval_indices]
+        return train_loader, valid_loaders
+
+    # Feature importances accumulated over the batches of the train rows
+    def _compute_feature_importances(self, X):
+        if self._stream is None:
+            return super()._compute_feature_importances(X)
+        dataset, train, _, _ = self._stream
+        total = 0
+        for X, _ in dataset.batches(train, 65536):
+            M_explain, _ = self.explain(X.numpy(), normalize=False)
+            total = total + M_explain.sum(axis=0)
+        return total / np.sum(total)
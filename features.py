@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# Statement variables, normalized by the market capitalization
+VARIABLES = ['netIncome',
+             'grossProfit',
+             'ebit',
+             'totalRevenue',
+             'costOfRevenue',
+             'totalOtherIncomeExpenseNet',
+             'otherCurrentLiab',
+             'totalAssets',
+             'commonStock',
+             'otherLiab',
+             'otherAssets',
+             'cash',
+             'propertyPlantEquipment',
+             'accountsPayable',
+             'capitalSurplus',
+             'changeToLiabilities',
+             'totalCashflowsFromInvestingActivities',
+             'netBorrowings',
+             'totalCashFromFinancingActivities',
+             'changeInCash',
+             'totalCashFromOperatingActivities',
+             'depreciation',
+             'changeToNetincome',
+             'capitalExpenditures',
+             'changeToOperatingActivities'
+             ]
+# Statement variables kept in absolute value
+VARIABLES_ABS = ['ebitAbs', 'totalRevenueAbs']
+TARGETS = ['market_cap',
+           'div_percent',
+           'yield',
+           'yield_ref',
+           'yield_next',
+           'yield_ref_next',
+           'outperform',
+           'outperform_next',
+           'positive',
+           'positive_next'
+           ]
+# Variables used by the models, for training and backtesting
+MODEL_FEATURES = VARIABLES + ['market_cap', 'div_percent'] + VARIABLES_ABS + \
+    ['yield', 'sector', 'outperform', 'positive']
+
+# Derived variables, declared once and evaluated in this order.
+# Dates are converted to days, a year being 52 weeks.
+FEATURE_EXPRESSIONS = {
+    # Yield for previous year
+    "yield": "log(price / price_previous) / ((date_price - date_price_previous) / 364)",
+    # Yield for next year
+    "yield_next": "log(price_next / price) / ((date_price_next - date_price) / 364)",
+    # Reference yield for previous year
+    "yield_ref": "log(ref / ref_previous) / ((date_ref - date_ref_previous) / 364)",
+    # Reference yield for next year
+    "yield_ref_next": "log(ref_next / ref) / ((date_ref_next - date_ref) / 364)",
+    # Best performance than reference for previous year
+    "outperform": "yield > yield_ref",
+    # Best performance than reference for next year
+    "outperform_next": "yield_next > yield_ref_next",
+    # Positivive performance for previous year
+    "positive": "yield > 0",
+    # Positive performance reference for next year
+    "positive_next": "yield_next > 0",
+    # Market capitalization
+    "market_cap": "price * sharesNumber",
+    # percent of dividends
+    "div_percent": "eps / price",
+    # Absolute values, before normalization
+    "ebitAbs": "ebit",
+    "totalRevenueAbs": "totalRevenue",
+}
+
+FUNCTIONS = {"log": np.log, "exp": np.exp, "sqrt": np.sqrt, "abs": np.abs,
+             "where": np.where}
+
+
+# Float values of a column, dates as days with NaN for missing dates
+def _as_float(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype="datetime64[ns]")
+        days = values.astype(np.int64) / 86400e9
+        return np.where(np.isnat(values), np.nan, days)
+    return series.to_numpy(dtype=float)
+
+
+# Registry of derived variables. Each expression is compiled with its inputs
+# renamed to the columns of a column-major block and the derived variables it
+# refers to renamed to their results, so that each derived variable is
+# evaluated once by numexpr and reused by the next expressions.
+class FeatureSet:
+
+    def __init__(self, expressions=FEATURE_EXPRESSIONS):
+        self.expressions = expressions
+        self.inputs = []
+        self.compiled = {}
+        for name, expression in expressions.items():
+            self.compiled[name] = re.sub(r"\b[A-Za-z_]\w*\b", self._rename,
+                                         expression)
+
+    # Inputs are renamed to block columns, derived variables to results
+    def _rename(self, match):
+        token = match.group(0)
+        if token in FUNCTIONS:
+            return token
+        if token in self.compiled:
+            return f"v{list(self.compiled).index(token)}"
+        if token not in self.inputs:
+            self.inputs.append(token)
+        return f"x{self.inputs.index(token)}"
+
+    def evaluate(self, data):
+        block = np.empty((len(data), len(self.inputs)), order="F")
+        for i, name in enumerate(self.inputs):
+            block[:, i] = _as_float(data[name])
+        local = {f"x{i}": block[:, i] for i in range(len(self.inputs))}
+        columns = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i, (name, expression) in enumerate(self.compiled.items()):
+                if numexpr is not None:
+                    columns[name] = numexpr.evaluate(expression, local_dict=local)
+                else:
+                    columns[name] = eval(expression, {"__builtins__": {}, **FUNCTIONS},
+                                         local)
+                local[f"v{i}"] = columns[name]
+        return pd.DataFrame(columns, index=data.index)
+
+
+# Divide some columns by another one, in place on a single block
+def normalize(data, columns, by):
+    block = data[columns].to_numpy(dtype=float, copy=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        block /= data[by].to_numpy(dtype=float)[:, None]
+    return block
+
+
+# Transforms of a current value and of its lagged value
+LAG_TRANSFORMS = {
+    "value": lambda current, lagged: lagged,
+    "diff": lambda current, lagged: current - lagged,
+    # previous minus current value, as the "_evol" variables are defined
+    "evol": lambda current, lagged: lagged - current,
+    "ratio": lambda current, lagged: current / lagged,
+    "pct_change": lambda current, lagged: current / lagged - 1,
+}
+
+
+# Lagged features per symbol in one pass over the frame. The lag k of a row
+# comes from the k-th previous distinct date of its symbol (last row of that
+# date), so rows sharing a date never see each other.
+def add_lags(data, features, lags=(1,), transforms=("diff",), by="symbol",
+             on="date", name="{feature}_{transform}{lag}"):
+    keys = [by, on]
+    distinct = data[keys + features].sort_values(keys, kind="mergesort")
+    distinct = distinct.drop_duplicates(keys, keep="last")
+    positions = pd.MultiIndex.from_frame(distinct[keys]).get_indexer(
+        pd.MultiIndex.from_frame(data[keys]))
+    grouped = distinct.groupby(by, sort=False)[features]
+    current = data[features].to_numpy(dtype=float)
+    columns = {}
+    for lag in lags:
+        lagged = grouped.shift(lag).to_numpy(dtype=float)[positions]
+        for transform in transforms:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = LAG_TRANSFORMS[transform](current, lagged)
+            for i, feature in enumerate(features):
+                columns[name.format(feature=feature, transform=transform,
+                                    lag=lag)] = values[:, i]
+    return pd.concat([data, pd.DataFrame(columns, index=data.index)], axis=1)
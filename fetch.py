@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from yahoofinancials.maps import FUNDAMENTALS_MAP
+
+# Yahoo Finance API root, can be pointed to a local stub server
+YAHOO_URL = "https://query1.finance.yahoo.com"
+SHARES_TYPES = ["annualPreferredSharesNumber", "annualOrdinarySharesNumber"]
+# Statement code -> (name of the statement table, fundamentals types),
+# the tables and columns of yahoofinancials annual statements
+STATEMENTS_CODES = {'income': ('incomeStatementHistory', 'income_statement'),
+                    'cash': ('cashflowStatementHistory', 'cash_flow'),
+                    'balance': ('balanceSheetHistory', 'balance_sheet')}
+# Units of the yfinance periods, "max" starts in 1900
+PERIODS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+TIMESERIES_PATH = "/ws/fundamentals-timeseries/v1/finance/timeseries/"
+
+
+# Token bucket shared by all the workers of a fetcher
+class TokenBucket:
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.timestamp) * self.rate)
+                self.timestamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# HTTP session with a connection pool sized for the workers
+def make_session(pool_size=8):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "Mozilla/5.0"
+    return session
+
+
+# Build statements rows from yahoofinancials output
+def parse_statements(all_statement_data):
+    statements = {}
+    for a in all_statement_data.keys():
+        statements[a] = list()
+        for b in all_statement_data[a]:
+            try:
+                for result in all_statement_data[a][b]:
+                    extracted_date = list(result)[0]
+                    dataframe_row = list(result.values())[0]
+                    dataframe_row['date'] = extracted_date
+                    dataframe_row['symbol'] = b
+                    statements[a].append(dataframe_row)
+            except Exception as e:
+                print("Error on " + b + " : " + a)
+    return statements
+
+
+# Build shares dataframe from the fundamentals timeseries output
+def parse_shares(content, ticker):
+    dct = dict()
+    for n in content['timeseries']['result']:
+        type = n['meta']['type'][0]
+        dct[type] = dict()
+        if type in n:
+            for o in n[type]:
+                if o is not None:
+                    dct[type][o['asOfDate']] = o['reportedValue']['raw']
+    df = pd.DataFrame.from_dict(dct)
+    df['symbol'] = ticker
+    return df
+
+
+# Build a prices dataframe with the yfinance history columns from the chart
+# output, indexed by the local dates of the exchange
+def parse_chart(content, actions=False):
+    if content['chart'].get('error'):
+        raise ValueError(content['chart']['error'].get('description'))
+    result = content['chart']['result'][0]
+    offset = pd.Timedelta(seconds=result['meta'].get('gmtoffset', 0))
+
+    def dates(timestamps):
+        return (pd.to_datetime(list(timestamps), unit="s") + offset).normalize()
+
+    index = dates(result.get('timestamp', []))
+    quote = result['indicators']['quote'][0]
+    adjclose = result['indicators'].get('adjclose', [{}])[0]
+    df = pd.DataFrame({"Open": quote.get('open', []),
+                       "High": quote.get('high', []),
+                       "Low": quote.get('low', []),
+                       "Close": quote.get('close', []),
+                       "Adj Close": adjclose.get('adjclose', quote.get('close', [])),
+                       "Volume": quote.get('volume', [])},
+                      index=index, dtype=float)
+    if actions:
+        events = result.get('events', {})
+        dividends = {a['date']: a['amount']
+                     for a in events.get('dividends', {}).values()}
+        splits = {a['date']: a['numerator'] / a['denominator']
+                  for a in events.get('splits', {}).values()}
+        for name, values in [("Dividends", dividends), ("Stock Splits", splits)]:
+            values = pd.Series(list(values.values()), dates(values.keys()),
+                               dtype=float)
+            df[name] = values.groupby(level=0).sum().reindex(index).fillna(0).values
+    df.index.name = "Date"
+    # The row of the current session may be repeated
+    return df[~df.index.duplicated(keep="last")]
+
+
+# Rows by date from the fundamentals timeseries output, with the names of the
+# yahoofinancials statements fields
+def parse_fundamentals(content):
+    rows = {}
+    for n in content['timeseries']['result']:
+        for key, records in n.items():
+            if key in ['meta', 'timestamp']:
+                continue
+            name = re.sub("^(quarterly|annual|trailing)", "", key)
+            name = name.lower() if name == "EBIT" else name[0].lower() + name[1:]
+            for o in records:
+                if o is not None:
+                    rows.setdefault(o['asOfDate'], {})[name] = \
+                        o.get('reportedValue', {}).get('raw')
+    return rows
+
+
+# Offset of a yfinance period such as "7y" or "6mo"
+def period_offset(period):
+    match = re.fullmatch(r"(\d+)([a-z]+)", period)
+    if match is None or match.group(2) not in PERIODS:
+        raise ValueError(f"Unknown period {period}")
+    return pd.DateOffset(**{PERIODS[match.group(2)]: int(match.group(1))})
+
+
+# Errors worth a retry: connection failures, timeouts, rate limiting and
+# server errors. Client errors and invalid payloads fail at once.
+def transient(error):
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status == 429 or (status is not None and status >= 500)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+# Concurrent fetch engine: bounded thread pool, shared rate limiter,
+# pooled session and exponential backoff on failures. Every endpoint is
+# requested through the session and the limiter, relative to base_url.
+class Fetcher:
+
+    def __init__(self, workers=8, rate=2, burst=4, retries=5, backoff=2,
+                 base_url=YAHOO_URL):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = base_url
+        self.limiter = TokenBucket(rate, burst)
+        self.session = make_session(workers)
+
+    def call(self, func, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries or not transient(e):
+                    raise
+                delay = self.backoff * 2 ** attempt
+                time.sleep(delay + random.uniform(0, self.backoff))
+
+    # Results by ticker in the order of tickers, and the (ticker, error) of the
+    # downloads failed after all the retries. callback(ticker, result) is
+    # called from the calling thread as soon as each download completes.
+    def map(self, func, tickers, desc=None, callback=None, **kwargs):
+        tickers = list(tickers)
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(self.call, func, ticker, **kwargs): ticker
+                       for ticker in tickers}
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               desc=desc):
+                ticker = futures[future]
+                try:
+                    results[ticker] = future.result()
+                except Exception as e:
+                    errors[ticker] = e
+                    continue
+                if callback is not None:
+                    callback(ticker, results[ticker])
+        return ({a: results[a] for a in tickers if a in results},
+                [(a, errors[a]) for a in tickers if a in errors])
+
+    def get_json(self, path, params=None):
+        self.limiter.acquire()
+        d = self.session.get(f"{self.base_url}{path}", params=params, timeout=30)
+        d.raise_for_status()
+        return d.json()
+
+    def timeseries(self, ticker, types, period1=0, period2=2013490868):
+        return self.get_json(TIMESERIES_PATH + ticker,
+                             params={"symbol": ticker,
+                                     "padTimeSeries": "true",
+                                     "type": ",".join(types),
+                                     "merge": "false",
+                                     "period1": period1,
+                                     "period2": period2})
+
+    # Daily prices from start, or over the period before end
+    def prices(self, ticker, start=None, end=None, period="max", interval="1d",
+               actions=False):
+        end = pd.Timestamp.today() if end is None else pd.Timestamp(end)
+        if start is not None:
+            start = pd.Timestamp(start)
+        elif period == "max":
+            start = pd.Timestamp("1900-01-01")
+        else:
+            start = end - period_offset(period)
+        content = self.get_json(f"/v8/finance/chart/{ticker}",
+                                params={"period1": int(start.timestamp()),
+                                        "period2": int(end.timestamp()),
+                                        "interval": interval,
+                                        "events": "div,splits",
+                                        "includeAdjustedClose": "true"})
+        return parse_chart(content, actions)
+
+    def statements(self, ticker):
+        all_statement_data = {}
+        for name, types in STATEMENTS_CODES.values():
+            rows = parse_fundamentals(
+                self.timeseries(ticker, FUNDAMENTALS_MAP[types]['annual']))
+            all_statement_data[name] = {
+                ticker.upper(): [{date: row} for date, row in rows.items()]}
+        return parse_statements(all_statement_data)
+
+    def shares(self, ticker):
+        return parse_shares(self.timeseries(ticker, SHARES_TYPES), ticker)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+
+import storage
+
+
+# First date to download for each ticker of a wide store: the last stored
+# date, whose close may come from an unfinished session and is overwritten
+# by the delta
+def delta_starts(prices):
+    return prices.apply(lambda x: x.last_valid_index()).dropna().to_dict()
+
+
+# Download prices from start, or the full period when start is None.
+# Adjusted closes are rescaled on dividends and splits, so the whole
+# history of a ticker is downloaded again when the delta contains one.
+def fetch_delta(fetcher, ticker, start=None, period="7y"):
+    if start is not None:
+        delta = fetcher.prices(ticker, start=start.strftime("%Y-%m-%d"),
+                               actions=True)
+        actions = delta.reindex(columns=["Dividends", "Stock Splits"])
+        if not (actions.fillna(0) != 0).any().any():
+            return delta, False
+    return fetcher.prices(ticker, period=period, actions=True), True
+
+
+# Merge a delta into a wide store, fully reloaded tickers are replaced
+def merge_wide(old, new, reloaded=()):
+    old = old.drop(columns=[a for a in reloaded if a in old.columns])
+    merged = new.combine_first(old)
+    return merged[sorted(merged.columns)]
+
+
+# Wide prices and dividends of the downloads {ticker: (delta, reloaded)},
+# merged into the old stores when given, and the first new date of each
+# updated ticker. Without any new row the old stores are returned unchanged.
+def merge_downloads(downloads, prices_old=None, dividends_old=None):
+    full_data = {a: tckr for a, (tckr, full) in downloads.items() if len(tckr)}
+    reloaded = [a for a, (tckr, full) in downloads.items() if full and a in full_data]
+    if not full_data:
+        updates = pd.DataFrame({"symbol": pd.Series(dtype=object),
+                                "date": pd.Series(dtype="datetime64[ns]")})
+        return prices_old, dividends_old, updates
+    ohlc = pd.concat(full_data.values(), axis=1,
+                     keys=full_data.keys(), sort=True)
+    ohlc.columns = ohlc.columns.swaplevel(0, 1)
+    ohlc.sort_index(level=0, axis=1, inplace=True)
+    prices = ohlc["Adj Close"]
+    dividends = ohlc["Dividends"]
+    # First new date per ticker, used to recompute downstream rows
+    updates = prices.apply(lambda x: x.first_valid_index()).dropna()
+    updates = pd.DataFrame({"symbol": updates.index, "date": updates.values})
+    if prices_old is not None:
+        prices = merge_wide(prices_old, prices, reloaded)
+        dividends = merge_wide(dividends_old, dividends, reloaded)
+    return prices, dividends, updates
+
+
+# Statements rows whose prices, reference or dividends changed since the
+# first updated date of their symbol or of the reference index
+def stale_rows(df, updates, ref_index, horizon=pd.DateOffset(years=1)):
+    first = updates.set_index('symbol')['date']
+    cutoff = df['symbol'].map(first)
+    if ref_index in first.index:
+        cutoff = cutoff.fillna(first[ref_index]).clip(upper=first[ref_index])
+    return (df['date'] + horizon >= cutoff).values
+
+
+# Updates not yet used by the preprocessing are kept, with the earliest
+# updated date of each symbol, so that skipped runs are not lost
+def write_updates(project, updates, root="data"):
+    previous = read_updates(project, root)
+    if previous is not None and len(previous):
+        updates = pd.concat([previous, updates]) if len(updates) else previous
+        updates = updates.groupby("symbol", as_index=False)["date"].min()
+    storage.write(updates, "prices_updates", project, root=root)
+
+
+def read_updates(project, root="data"):
+    if not storage.exists("prices_updates", project, root=root):
+        return None
+    return storage.read("prices_updates", project, root=root)
+
+
+# Empty updates once the preprocessing used them, so that the next run only
+# computes the new rows
+def clear_updates(project, root="data"):
+    updates = pd.DataFrame({"symbol": pd.Series(dtype=object),
+                            "date": pd.Series(dtype="datetime64[ns]")})
+    storage.write(updates, "prices_updates", project, root=root)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+
+import pandas as pd
+
+
+# Append-only ingestion journal, one record per (project, dataset, ticker).
+# A payload is a dictionary of table name -> list of rows.
+class Journal:
+
+    def __init__(self, path="data/journal.sqlite"):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS journal ("
+                                "project TEXT, dataset TEXT, ticker TEXT, "
+                                "payload TEXT, "
+                                "PRIMARY KEY (project, dataset, ticker))")
+        self.connection.commit()
+
+    # Each append is its own transaction
+    def append(self, project, dataset, ticker, payload):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO journal "
+                                    "VALUES (?, ?, ?, ?)",
+                                    (project, dataset, ticker,
+                                     json.dumps(payload)))
+
+    # Tickers already ingested, used to resume an interrupted run
+    def done(self, project, dataset):
+        cursor = self.connection.execute("SELECT ticker FROM journal "
+                                         "WHERE project = ? AND dataset = ?",
+                                         (project, dataset))
+        return {row[0] for row in cursor}
+
+    # Gather all the payloads of a dataset into one dataframe per table
+    def compact(self, project, dataset):
+        cursor = self.connection.execute("SELECT payload FROM journal "
+                                         "WHERE project = ? AND dataset = ? "
+                                         "ORDER BY ticker",
+                                         (project, dataset))
+        tables = {}
+        for (payload,) in cursor:
+            for name, rows in json.loads(payload).items():
+                if name not in tables:
+                    tables[name] = list()
+                tables[name] += rows
+        return {name: pd.DataFrame(rows) for name, rows in tables.items()}
+
+    # Called once the compacted tables are stored, the next run starts over
+    def clear(self, project, dataset):
+        with self.connection:
+            self.connection.execute("DELETE FROM journal "
+                                    "WHERE project = ? AND dataset = ?",
+                                    (project, dataset))
+
+    def close(self):
+        self.connection.close()
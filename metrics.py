@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+# Trading days in a year
+PERIODS = 252
+
+
+# Performance statistics of daily returns, each column of the (days x
+# strategies) matrix being a strategy. Same definitions as pyfolio's
+# perf_stats (without risk free rate), missing returns counting as 0 in the
+# cumulative returns and being ignored in the moments.
+
+def _matrix(returns):
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    return returns
+
+
+def cagr(returns, periods=PERIODS):
+    r = np.asarray(returns, dtype=float)
+    final = np.prod(1 + np.nan_to_num(r), axis=0)
+    return final ** (periods / len(r)) - 1
+
+
+def volatility(returns, periods=PERIODS):
+    return np.nanstd(np.asarray(returns, dtype=float), axis=0, ddof=1) * np.sqrt(periods)
+
+
+def sharpe(returns, periods=PERIODS):
+    r = np.asarray(returns, dtype=float)
+    return np.nanmean(r, axis=0) / np.nanstd(r, axis=0, ddof=1) * np.sqrt(periods)
+
+
+def sortino(returns, periods=PERIODS):
+    r = np.asarray(returns, dtype=float)
+    downside = np.sqrt(np.nanmean(np.minimum(r, 0) ** 2, axis=0) * periods)
+    return np.nanmean(r, axis=0) * periods / downside
+
+
+# Largest loss from a previous peak, the initial value being a peak
+def max_drawdown(returns):
+    r = np.asarray(returns, dtype=float)
+    wealth = np.cumprod(1 + np.nan_to_num(r), axis=0)
+    peak = np.maximum(np.maximum.accumulate(wealth, axis=0), 1)
+    return np.min(wealth / peak - 1, axis=0)
+
+
+def calmar(returns, periods=PERIODS):
+    return cagr(returns, periods) / np.abs(max_drawdown(returns))
+
+
+# Annualized alpha and beta of each strategy against a benchmark, on the
+# days where both returns are available
+def alpha_beta(returns, benchmark, periods=PERIODS):
+    r = np.asarray(returns, dtype=float)
+    b = np.asarray(benchmark, dtype=float)[:, None]
+    both = ~np.isnan(r) & ~np.isnan(b)
+    r = np.where(both, r, np.nan)
+    b = np.where(both, b, np.nan)
+    b_centered = b - np.nanmean(b, axis=0)
+    beta = np.nanmean(b_centered * (r - np.nanmean(r, axis=0)), axis=0) \
+        / np.nanmean(b_centered ** 2, axis=0)
+    alpha = (np.nanmean(r - beta * b, axis=0) + 1) ** periods - 1
+    return alpha, beta
+
+
+# Average daily one-way turnover of (days x tickers) weights
+def turnover(weights):
+    w = np.nan_to_num(np.asarray(weights, dtype=float))
+    return np.abs(np.diff(w, axis=0)).sum(axis=1).mean() / 2
+
+
+# Table of the statistics (rows) of each strategy (columns), with alpha and
+# beta against each benchmark column and the turnover of the strategies
+# whose weights are given
+def perf_stats(returns, benchmarks=None, weights=None, periods=PERIODS):
+    returns = _matrix(returns)
+    stats = {"Annual return": cagr(returns, periods),
+             "Cumulative returns": np.prod(1 + np.nan_to_num(returns.values), axis=0) - 1,
+             "Annual volatility": volatility(returns, periods),
+             "Sharpe ratio": sharpe(returns, periods),
+             "Sortino ratio": sortino(returns, periods),
+             "Max drawdown": max_drawdown(returns),
+             "Calmar ratio": calmar(returns, periods)}
+    if benchmarks is not None:
+        benchmarks = _matrix(benchmarks)
+        for name in benchmarks.columns:
+            alpha, beta = alpha_beta(returns, benchmarks[name].reindex(returns.index),
+                                     periods)
+            stats[f"Alpha ({name})"] = alpha
+            stats[f"Beta ({name})"] = beta
+    table = pd.DataFrame(stats, index=returns.columns).T
+    if weights is not None:
+        table.loc["Daily turnover"] = pd.Series({name: turnover(w)
+                                                 for name, w in weights.items()})
+    return table
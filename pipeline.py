@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import config
+
+try:
+    import resource
+except ImportError:
+    # Windows, the peak memory is not reported
+    resource = None
+
+STATE = ".pipeline/state.json"
+
+PROJECT_DATASETS = ["prices_daily", "dividends", "incomeStatementHistory",
+                    "balanceSheetHistory", "cashflowStatementHistory", "shares"]
+
+
+# Extension of the model saved by each backend of backends.py, which is not
+# imported as it loads torch
+MODEL_EXTENSIONS = {"tabnet": ".zip", "hgb": ".pkl", "logistic": ".pkl"}
+
+
+def _stores(datasets, projects=None):
+    if projects is None:
+        return [f"data/{a}.parquet" for a in datasets]
+    return [f"data/{p}/{a}.parquet" for p in projects for a in datasets]
+
+
+# Stages of the pipeline with their declared inputs, outputs and the
+# parameters of config.py they depend on. A stage without inputs reads
+# remote data and is always run.
+STAGES = {
+    "get_data": {"script": "1_get_data.py",
+                 "deps": [],
+                 "inputs": [],
+                 "outputs": _stores(PROJECT_DATASETS, config.PROJECTS),
+                 "params": ["PROJECTS", "REF_INDEXES"]},
+    "preprocess": {"script": "2_preprocess_data.py",
+                   "deps": ["get_data"],
+                   "inputs": _stores(PROJECT_DATASETS, config.PROJECTS)
+                   + [f"data/{p}/{p}.csv" for p in config.PROJECTS],
+                   "outputs": _stores(["data"], config.PROJECTS)
+                   + _stores(["data"]),
+                   "params": ["PROJECTS", "REF_INDEX"]},
+    "feature_eng": {"script": "3_feature_eng.py",
+                    "deps": ["preprocess"],
+                    "inputs": _stores(["data"]),
+                    "outputs": _stores(["data_clean", "data_evol_clean"]),
+                    "params": []},
+    "model": {"script": "4_model.py",
+              "deps": ["feature_eng"],
+              "inputs": _stores(["data_clean"]) + ["models/search_best.json"],
+              "outputs": ["models/model" + MODEL_EXTENSIONS[config.BACKEND],
+                          "models/preprocessor.pkl"],
+              "params": ["FEATURES", "TARGET", "DATE_VALID", "DATE_TEST",
+                         "BACKEND"]},
+    "backtest": {"script": "5_backtest.py",
+                 "deps": ["feature_eng"],
+                 "inputs": _stores(["data_clean"])
+                 + _stores(["prices_daily"], config.PROJECTS),
+                 "outputs": ["backtest/probas.parquet"],
+                 "params": ["PROJECTS", "FEATURES", "TARGET", "DATE_START"]},
+    "strategies": {"script": "6_strategies.py",
+                   "deps": ["backtest"],
+                   "inputs": ["backtest/probas.parquet"]
+                   + _stores(["prices_daily"], config.PROJECTS),
+                   "outputs": ["backtest/yields.csv"],
+                   "params": ["PROJECTS"]},
+}
+
+
+def hash_file(path, h=None):
+    h = h or hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h
+
+
+# Local modules imported by a script, recursively
+def local_modules(script, seen=None):
+    seen = seen if seen is not None else set()
+    with open(script) as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            path = name.split(".")[0] + ".py"
+            if os.path.exists(path) and path not in seen:
+                seen.add(path)
+                local_modules(path, seen)
+    return seen
+
+
+# Fingerprint of the code, inputs and parameters of a stage
+def fingerprint(stage):
+    h = hashlib.sha256()
+    for path in [stage["script"]] + sorted(local_modules(stage["script"])):
+        h.update(path.encode())
+        hash_file(path, h)
+    for path in stage["inputs"]:
+        h.update(path.encode())
+        if os.path.exists(path):
+            hash_file(path, h)
+    for name in stage["params"]:
+        h.update(f"{name}={getattr(config, name)!r}".encode())
+    return h.hexdigest()
+
+
+def load_state():
+    if not os.path.exists(STATE):
+        return {}
+    with open(STATE) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE), exist_ok=True)
+    with open(STATE, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+# Stages needed to build the targets, in dependency order
+def plan(targets):
+    order = []
+
+    def visit(name):
+        for dep in STAGES[name]["deps"]:
+            visit(dep)
+        if name not in order:
+            order.append(name)
+
+    for name in targets:
+        visit(name)
+    return order
+
+
+# Run a stage script, returning its wall time (s) and peak memory (MB).
+# The peak is read from the rusage of this stage's process when it is
+# waited for, RUSAGE_CHILDREN would hold the largest peak of all the stages
+# run so far. It includes the memory of the pipeline process when the stage
+# was started, which is small.
+def run_stage(stage):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, stage["script"]])
+    if resource is None or not hasattr(os, "wait4"):
+        process.wait()
+        usage = None
+    else:
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{stage['script']} failed ({process.returncode})")
+    if usage is None:
+        return wall, float("nan")
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return wall, usage.ru_maxrss * scale / 2 ** 20
+
+
+def run(targets, force=False, skip_remote=False):
+    state = load_state()
+    report = []
+    for name in plan(targets):
+        stage = STAGES[name]
+        remote = not stage["inputs"]
+        outputs_ok = all(os.path.exists(a) for a in stage["outputs"])
+        key = fingerprint(stage)
+        cached = state.get(name, {})
+        if remote and skip_remote and outputs_ok:
+            report.append((name, "skipped", 0, 0))
+            continue
+        if (not force and not remote and outputs_ok
+                and cached.get("fingerprint") == key
+                and cached.get("outputs") == {a: hash_file(a).hexdigest()
+                                              for a in stage["outputs"]}):
+            report.append((name, "cached", 0, 0))
+            continue
+        print(f"Running {name}")
+        wall, memory = run_stage(stage)
+        state[name] = {"fingerprint": key,
+                       "outputs": {a: hash_file(a).hexdigest()
+                                   for a in stage["outputs"]
+                                   if os.path.exists(a)},
+                       "wall_time": wall,
+                       "peak_memory": memory}
+        save_state(state)
+        report.append((name, "run", wall, memory))
+
+    print(f"\n{'stage':<12} {'status':<8} {'wall (s)':>10} {'peak (MB)':>10}")
+    for name, status, wall, memory in report:
+        print(f"{name:<12} {status:<8} {wall:>10.1f} {memory:>10.1f}")
+    return report
+
+
+# Stages given on the command line, all the stages by default
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline stages")
+    parser.add_argument("stages", nargs="*",
+                        help=f"stages to run among {', '.join(STAGES)}, "
+                        "all by default")
+    parser.add_argument("--force", action="store_true",
+                        help="run the stages even if their cache is valid")
+    parser.add_argument("--skip-remote", action="store_true",
+                        help="do not download again when the data exists")
+    args = parser.parse_args(argv)
+    unknown = [a for a in args.stages if a not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages {unknown}")
+    args.stages = args.stages or list(STAGES)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.stages, args.force, args.skip_remote)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+import storage
+from incremental import clear_updates, read_updates, stale_rows
+from price_matrix import PriceMatrix
+from timeseries import AsofIndex
+
+
+# Build the (dates x tickers) matrices shared by all the projects
+def build_shared(projects, datasets=("prices_daily", "dividends")):
+    for dataset in datasets:
+        matrix = PriceMatrix.build(projects, dataset, np.float64)
+        matrix.save(PriceMatrix.name(dataset, np.float64))
+
+
+# Long (Date, variable, value) table of some tickers of a shared matrix
+def shared_long(dataset, symbols):
+    return PriceMatrix.load(PriceMatrix.name(dataset, np.float64)).long(symbols)
+
+
+# Preprocess one project into data/{project}/data
+def preprocess(project, ref_index="^IXIC", incremental=True, export_csv=False):
+    print(project)
+
+    # Load data
+    income = storage.read("incomeStatementHistory", project)
+    balance = storage.read("balanceSheetHistory", project)
+    cashflow = storage.read("cashflowStatementHistory", project)
+    companies = pd.read_csv(f"data/{project}/{project}.csv", sep=",")
+    shares = storage.read("shares", project)
+    symbols = income.symbol.unique().tolist() + [ref_index]
+    prices_long = shared_long("prices_daily", symbols)
+    dividends_long = shared_long("dividends", symbols)
+    print("Data loaded")
+
+    # Merge financial statements
+    fin_stats = income.merge(balance,
+                             on=['date', 'symbol'],
+                             how="inner",
+                             suffixes=("", "_y"))
+    fin_stats = fin_stats.merge(cashflow,
+                                on=['date', 'symbol'],
+                                how="inner",
+                                suffixes=("", "_y"))
+    print("Statetements merged")
+
+    # Keep the rows untouched by the prices update from the previous run
+    fin_old = None
+    updates = read_updates(project)
+    if incremental and updates is not None and storage.exists("data", project):
+        fin_old = storage.read("data", project)
+        known = pd.MultiIndex.from_frame(fin_old[['symbol', 'date']])
+        new = ~pd.MultiIndex.from_frame(fin_stats[['symbol', 'date']]).isin(known)
+        fin_stats = fin_stats[new | stale_rows(fin_stats, updates, ref_index)]
+        fin_old = fin_old[~stale_rows(fin_old, updates, ref_index)]
+        print(f"{len(fin_stats)} rows to update")
+
+    # Merge with price current year, previous year and next year
+    fin = fin_stats.sort_values("date").reset_index(drop=True)
+    prices_index = AsofIndex(prices_long, by="variable", on="Date")
+    for suffix, offset in [("", None),
+                           ("_previous", pd.DateOffset(years=1)),
+                           ("_next", -pd.DateOffset(years=1))]:
+        positions = prices_index.lookup(fin.symbol, fin.date, offset)
+        fin["date_price" + suffix] = prices_index.take(positions, "Date")
+        fin["price" + suffix] = prices_index.take(positions, "value")
+    print("Prices merged")
+
+    # Merge with dividends
+    dividends_long = dividends_long[dividends_long.value.fillna(0) != 0]
+    dividends_index = AsofIndex(dividends_long, by="variable", on="Date")
+    fin['eps'] = dividends_index.trailing(fin.symbol, fin.date, "value",
+                                          pd.DateOffset(years=1))
+    print("Dividends merged")
+
+    # Merge with sector
+    cpn = companies[['Symbol', 'Sector']]
+    fin = fin.merge(cpn, left_on="symbol", right_on="Symbol")
+    fin = fin.rename(columns={"Sector": "sector"})
+    fin = fin.drop(columns=["Symbol"])
+    print("Sector merged")
+
+    # Add reference index
+    df1 = prices_long[prices_long.variable == ref_index].sort_values("Date")
+    fin = fin.sort_values("date")
+    fin = fin[fin['date_price_previous'].notnull()]
+    fin = pd.merge_asof(fin,
+                        df1,
+                        left_on="date_price",
+                        right_on="Date",
+                        direction="nearest",
+                        suffixes=("", "_ref"))
+    fin = pd.merge_asof(fin,
+                        df1,
+                        left_on="date_price_next",
+                        right_on="Date",
+                        direction="nearest",
+                        suffixes=("", "_ref_next"))
+    fin = pd.merge_asof(fin,
+                        df1,
+                        left_on="date_price_previous",
+                        right_on="Date",
+                        direction="nearest",
+                        suffixes=("", "_ref_previous"))
+    fin = fin.rename(columns={"value": "ref",
+                              "Date": "date_ref",
+                              "value_ref_next": "ref_next",
+                              "value_ref_previous":"ref_previous",
+                              "Date_ref_next": "date_ref_next",
+                              "Date_ref_previous": "date_ref_previous"})
+    fin = fin.drop(columns=["variable", "variable_ref_next", "variable_ref_previous"])
+    fin = fin.sort_values(["symbol", "date"])
+    print("Reference index merged")
+
+    # Merge with shares
+    shares = shares.fillna(0)
+    shares['sharesNumber'] = shares['annualOrdinarySharesNumber'] + shares['annualPreferredSharesNumber']
+    shares = shares.drop(columns=["annualOrdinarySharesNumber", "annualPreferredSharesNumber"])
+    fin = fin.reset_index(drop=True)
+    shares_index = AsofIndex(shares, by="symbol", on="date")
+    positions = shares_index.lookup(fin.symbol, fin.date, direction="nearest")
+    fin["sharesNumber"] = shares_index.take(positions, "sharesNumber")
+    if fin_old is not None:
+        fin = pd.concat([fin_old, fin]).sort_values(["symbol", "date"]).reset_index(drop=True)
+
+    # Assess missing values
+    percent_missing = fin.isnull().sum() * 100 / len(fin)
+    print(percent_missing.sort_values())
+
+    # save, then clear the prices updates now included in the data
+    storage.write(fin, "data", project, csv=export_csv)
+    clear_updates(project)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+# Sorted categories, as LabelEncoder orders its classes
+def _sorted(values):
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=lambda a: (type(a).__name__, str(a)))
+
+
+# Encoder of the model variables: label encoding of the categorical
+# columns (objects or less than max_categories values) and standard
+# scaling of the numeric ones, missing values being filled with "Unknown"
+# or the mean. Column types are inferred on the first fit only, then the
+# statistics can be updated with new rows through partial_fit.
+class TabularPreprocessor:
+
+    def __init__(self, features, target=None, max_categories=200):
+        self.features = list(features)
+        self.target = target
+        self.max_categories = max_categories
+        self.categorical = None
+        self.categories = {}
+        self.stats = {}
+
+    @property
+    def columns(self):
+        return self.features + ([self.target] if self.target is not None else [])
+
+    @property
+    def numeric(self):
+        return [a for a in self.columns if a not in self.categorical]
+
+    # Column types, inferred from the first fitted rows unless called before
+    def infer(self, data):
+        nunique = data[self.columns].nunique()
+        types = data[self.columns].dtypes
+        self.categorical = [a for a in self.columns
+                            if types[a] == 'object' or nunique[a] < self.max_categories]
+        return self
+
+    # Column types inferred over chunks of rows, as infer does on a frame.
+    # Distinct values are only counted up to max_categories.
+    def infer_chunks(self, chunks):
+        objects = set()
+        values = {a: set() for a in self.columns}
+        for chunk in chunks:
+            for col in self.columns:
+                if chunk[col].dtype == 'object':
+                    objects.add(col)
+                if len(values[col]) < self.max_categories:
+                    values[col].update(pd.unique(chunk[col].dropna()))
+        self.categorical = [a for a in self.columns
+                            if a in objects or len(values[a]) < self.max_categories]
+        return self
+
+    # Fit on chunks of rows, make_chunks() giving a new iterator over them
+    # for each of the two passes
+    def fit_chunks(self, make_chunks):
+        self.categories = {}
+        self.stats = {}
+        self.infer_chunks(make_chunks())
+        for chunk in make_chunks():
+            self.partial_fit(chunk)
+        return self
+
+    def fit(self, data):
+        self.categorical = None
+        self.categories = {}
+        self.stats = {}
+        return self.partial_fit(data)
+
+    # Update the categories and the statistics with new rows
+    def partial_fit(self, data):
+        if self.categorical is None:
+            self.infer(data)
+        for col in self.categorical:
+            values = data[col].astype(object).where(data[col].notnull(), "Unknown")
+            known = self.categories.get(col, [])
+            new = _sorted(set(pd.unique(values)) - set(known))
+            # New categories are appended so that the codes stay stable
+            self.categories[col] = known + new
+        block = data[self.numeric].to_numpy(dtype=float)
+        present = ~np.isnan(block)
+        count = present.sum(axis=0)
+        mean = np.nansum(block, axis=0) / np.maximum(count, 1)
+        m2 = np.nansum((block - mean) ** 2, axis=0)
+        if not self.stats:
+            self.stats = {"rows": len(block), "count": count, "mean": mean, "m2": m2}
+            return self
+        # Parallel update of the means and sums of squared deviations
+        stats = self.stats
+        total = stats["count"] + count
+        delta = mean - stats["mean"]
+        weight = np.where(total > 0, count / np.maximum(total, 1), 0)
+        stats["mean"] = stats["mean"] + delta * weight
+        stats["m2"] = stats["m2"] + m2 + delta ** 2 * stats["count"] * weight
+        stats["count"] = total
+        stats["rows"] += len(block)
+        return self
+
+    # Missing values are filled with the mean, so the scale is computed
+    # over all the rows
+    @property
+    def scale(self):
+        std = np.sqrt(self.stats["m2"] / max(self.stats["rows"], 1))
+        return np.where(std == 0, 1, std)
+
+    # Categorical features are encoded from 1, the code 0 being reserved for
+    # the categories unseen by the fit. The target has no unknown code.
+    def _encode(self, data, columns, unknown=True):
+        encoded = np.empty((len(data), len(columns)))
+        numeric = [a for a in columns if a not in self.categorical]
+        if numeric:
+            index = [self.numeric.index(a) for a in numeric]
+            block = data[numeric].to_numpy(dtype=float)
+            mean = self.stats["mean"][index]
+            block = np.where(np.isnan(block), mean, block)
+            block = (block - mean) / self.scale[index]
+            encoded[:, [columns.index(a) for a in numeric]] = block
+        for col in columns:
+            if col in self.categorical:
+                values = data[col].astype(object).where(data[col].notnull(), "Unknown")
+                codes = pd.Index(self.categories[col]).get_indexer(values)
+                if unknown:
+                    codes = codes + 1
+                elif (codes < 0).any():
+                    raise ValueError(f"Unseen values of {col}: "
+                                     f"{_sorted(set(values[codes < 0]))}")
+                encoded[:, columns.index(col)] = codes
+        return encoded
+
+    def transform(self, data):
+        return self._encode(data, self.features)
+
+    def transform_target(self, data):
+        return self._encode(data, [self.target], unknown=False)[:, 0]
+
+    @property
+    def cat_idxs(self):
+        return [i for i, f in enumerate(self.features) if f in self.categorical]
+
+    @property
+    def cat_dims(self):
+        return [len(self.categories[f]) + 1 for f in self.features if f in self.categorical]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+
+# Dense (dates x tickers) matrix of a wide dataset for several projects,
+# with O(1) date -> row and ticker -> column lookups
+class PriceMatrix:
+
+    def __init__(self, values, dates, tickers):
+        self.values = values
+        self.dates = pd.DatetimeIndex(dates, name='Date')
+        self.tickers = pd.Index(tickers)
+        self.rows = {date: i for i, date in enumerate(self.dates)}
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self._mask = None
+
+    # Build from the per project stores, a ticker present in several
+    # projects is taken from the first one
+    @classmethod
+    def build(cls, projects, dataset="prices_daily", dtype=np.float32):
+        frames = []
+        tickers = set()
+        for project in projects:
+            df = storage.read_wide(dataset, project)
+            frames.append(df[df.columns.difference(tickers)])
+            tickers.update(df.columns)
+        df = pd.concat(frames, axis=1, join="outer").sort_index()
+        return cls(df.values.astype(dtype), df.index, df.columns)
+
+    @staticmethod
+    def name(dataset="prices_daily", dtype=np.float32):
+        return f"{dataset}_{np.dtype(dtype).name}"
+
+    def save(self, name, root="data"):
+        storage.write_matrix(self.values, self.dates, self.tickers, name, root)
+
+    @classmethod
+    def load(cls, name, root="data", mmap_mode="r"):
+        return cls(*storage.read_matrix(name, root, mmap_mode))
+
+    # Load the cached matrix, rebuilt when a project store is more recent
+    @classmethod
+    def cached(cls, projects, dataset="prices_daily", dtype=np.float32,
+               root="data"):
+        name = cls.name(dataset, dtype)
+        cache = storage.path(name, None, root, "npy")
+        sources = [storage.path(dataset, project, root, ext)
+                   for project in projects for ext in ["parquet", "csv"]]
+        sources = [os.path.getmtime(a) for a in sources if os.path.exists(a)]
+        if not os.path.exists(cache) or os.path.getmtime(cache) < max(sources):
+            cls.build(projects, dataset, dtype).save(name, root)
+        return cls.load(name, root)
+
+    # True where a value is available
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = ~np.isnan(self.values)
+        return self._mask
+
+    def row(self, date):
+        return self.rows[pd.Timestamp(date)]
+
+    def column(self, ticker):
+        return self.columns[ticker]
+
+    def get(self, date, ticker):
+        return self.values[self.row(date), self.column(ticker)]
+
+    # Rows of the dates in [start, end)
+    def date_slice(self, start=None, end=None):
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        last = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end))
+        return slice(first, last)
+
+    # Dataframe view of a date range and of some tickers
+    def frame(self, start=None, end=None, tickers=None):
+        rows = self.date_slice(start, end)
+        if tickers is None:
+            return pd.DataFrame(self.values[rows], index=self.dates[rows],
+                                columns=self.tickers)
+        cols = [self.columns[a] for a in tickers]
+        return pd.DataFrame(self.values[rows][:, cols], index=self.dates[rows],
+                            columns=pd.Index(tickers))
+
+    # Long (Date, variable, value) table of some tickers
+    def long(self, tickers):
+        cols = self.tickers.get_indexer(pd.unique(np.asarray(tickers, dtype=object)))
+        cols = cols[cols >= 0]
+        return pd.DataFrame({"Date": np.tile(self.dates.values, len(cols)),
+                             "variable": np.repeat(self.tickers.values[cols],
+                                                   len(self.dates)),
+                             "value": self.values[:, cols].T.ravel()})
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# Aggregations of the scores of the statement rows of a symbol in a window:
+# the highest, the mean, or the score of the latest statement
+AGGREGATIONS = ["max", "mean", "last"]
+
+
+# One score per (date, symbol) of long window scores (date, symbol,
+# statement, proba), grouped without a python loop over the symbols
+def aggregate(scores, how="max"):
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {how}, expected one of {AGGREGATIONS}")
+    if how == "last":
+        latest = scores.sort_values(["date", "symbol", "statement"], kind="mergesort") \
+            .drop_duplicates(["date", "symbol"], keep="last")
+        return latest[["date", "symbol", "proba"]].reset_index(drop=True)
+    return scores.groupby(["date", "symbol"], sort=True, observed=True) \
+        .proba.agg(how).reset_index()
+
+
+# Backtest scores as a long table of intervals: the proba of a symbol
+# applies to the prices dated in [date_start, date_end). Dense blocks aligned
+# on a PriceMatrix are only built for the requested dates.
+class Probas:
+
+    columns = ["date_start", "date_end", "symbol", "proba"]
+
+    def __init__(self, table):
+        self.table = table[self.columns].sort_values(
+            ["date_start", "date_end", "symbol"], kind="mergesort").reset_index(drop=True)
+
+    # Aggregated window scores, the window of a date ending at the next date
+    # of the sorted dates (the last one only closes the last window)
+    @classmethod
+    def from_scores(cls, scores, dates, how="max"):
+        dates = pd.DatetimeIndex(dates)
+        table = aggregate(scores, how)
+        table = table[table.date.isin(dates[:-1])]
+        ends = dates[dates.searchsorted(table.date) + 1]
+        return cls(pd.DataFrame({"date_start": table.date.values,
+                                 "date_end": ends,
+                                 "symbol": table.symbol.values,
+                                 "proba": table.proba.values}))
+
+    @classmethod
+    def read(cls, root="backtest"):
+        return cls(storage.read("probas", root=root))
+
+    def write(self, root="backtest"):
+        storage.write(self.table, "probas", root=root)
+
+    @property
+    def start(self):
+        return self.table.date_start.min()
+
+    # Dense (dates x tickers) probas over the rows of a price matrix in
+    # [start, end), NaN where a symbol has no score, no price or a zero score
+    def values(self, prices, start=None, end=None):
+        rows = prices.date_slice(start, end)
+        dates = prices.dates[rows]
+        table = self.table[(self.table.date_end > dates[0])
+                           & (self.table.date_start <= dates[-1])] \
+            if len(dates) else self.table.iloc[:0]
+        block = np.full((len(dates), len(prices.tickers)), np.nan)
+        # Each score fills the rows of its interval in the column of its
+        # symbol, the (row, column) pairs of all the scores being scattered
+        # at once
+        cols = prices.tickers.get_indexer(table.symbol)
+        keep = cols >= 0
+        first = dates.searchsorted(table.date_start.values[keep])
+        lengths = dates.searchsorted(table.date_end.values[keep]) - first
+        rows_of = np.repeat(first - np.cumsum(lengths) + lengths, lengths) \
+            + np.arange(lengths.sum())
+        block[rows_of, np.repeat(cols[keep], lengths)] = \
+            np.repeat(table.proba.values[keep], lengths)
+        block[~prices.mask[rows]] = np.nan
+        block[block == 0] = np.nan
+        return block
+
+    def frame(self, prices, start=None, end=None):
+        rows = prices.date_slice(start, end)
+        return pd.DataFrame(self.values(prices, start, end),
+                            index=prices.dates[rows], columns=prices.tickers)
+
+    # Dense frames of the windows one after the other
+    def chunks(self, prices):
+        for date_start, date_end in self.table[["date_start", "date_end"]] \
+                .drop_duplicates().itertuples(index=False):
+            yield self.frame(prices, date_start, date_end)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+import torch
+
+import backends
+import storage
+from preprocessor import TabularPreprocessor
+
+
+# Trained model and its fitted preprocessing, loaded once to score new
+# statement rows. Predictions are memoized by key (a dataset split) and by a
+# fingerprint of the scored rows, in a LRU cache of cache_size entries.
+class Scorer:
+
+    def __init__(self, clf, preprocessor, batch_size=65536, threads=None,
+                 cache_size=16):
+        self.clf = clf
+        self.preprocessor = preprocessor
+        self.batch_size = batch_size
+        if threads is not None:
+            torch.set_num_threads(threads)
+        if isinstance(clf, backends.TabNetBackend):
+            self.clf.network.eval()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = Lock()
+
+    # The model saved by 4_model.py by default, whatever its backend
+    @classmethod
+    def load(cls, model=None, preprocessor="models/preprocessor.pkl",
+             batch_size=65536, threads=None):
+        model = backends.saved_model() if model is None else model
+        return cls(backends.load(model), TabularPreprocessor.load(preprocessor), batch_size,
+                   threads)
+
+    # Hash of the indices and of the content of the scored rows, read batch
+    # by batch like the predictions
+    def fingerprint(self, X, rows):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(np.shape(X)[1:]).encode())
+        h.update(np.ascontiguousarray(rows, dtype=np.int64).tobytes())
+        for start in range(0, len(rows), self.batch_size):
+            batch = np.asarray(X[rows[start:start + self.batch_size]], dtype=np.float32)
+            h.update(np.ascontiguousarray(batch).tobytes())
+        return h.hexdigest()
+
+    # Probability of the positive class of encoded rows, in large batches
+    # without autograd for TabNet. Only some rows of X are scored when given, in
+    # increasing order, so that a memmap is read batch by batch.
+    def predict(self, X, key=None, rows=None):
+        rows = np.arange(len(X)) if rows is None else np.sort(rows)
+        if key is not None:
+            key = (key, self.fingerprint(X, rows))
+        with self.lock:
+            if key is not None and key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            probas = np.empty(len(rows), dtype=np.float32)
+            with torch.inference_mode():
+                for start in range(0, len(rows), self.batch_size):
+                    batch = np.asarray(X[rows[start:start + self.batch_size]],
+                                       dtype=np.float32)
+                    if isinstance(self.clf, backends.TabNetBackend):
+                        output, _ = self.clf.network(torch.from_numpy(batch).to(self.clf.device))
+                        batch_probas = torch.softmax(output, dim=1)[:, 1].cpu().numpy()
+                    else:
+                        batch_probas = self.clf.predict_proba(batch)[:, 1]
+                    probas[start:start + len(batch)] = batch_probas
+            if key is not None:
+                self.cache[key] = probas
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return probas
+
+    # Scores of statement rows, with their symbol and date
+    def score(self, data, key=None):
+        probas = self.predict(self.preprocessor.transform(data), key)
+        return pd.DataFrame({"symbol": data.symbol.values,
+                             "date": data.date.values,
+                             "proba": probas})
+
+    # Scores of the rows of a stored dataset in [start, end)
+    def score_dataset(self, dataset="data_clean", start=None, end=None,
+                      root="data"):
+        file = storage.path(dataset, None, root)
+        mtime = os.path.getmtime(file) if os.path.exists(file) else None
+        key = (dataset, root, str(start), str(end), mtime)
+        return self.score(storage.read(dataset, None, root, start=start,
+                                       end=end), key)
+
+    # Request of the workers: either records of statement rows or a stored
+    # dataset with an optional date range
+    def handle(self, request):
+        if "records" in request:
+            data = pd.DataFrame.from_records(request["records"])
+            data["date"] = pd.to_datetime(data["date"])
+            scores = self.score(data)
+        else:
+            scores = self.score_dataset(request.get("dataset", "data_clean"),
+                                        request.get("start"),
+                                        request.get("end"))
+        scores["date"] = scores["date"].dt.strftime("%Y-%m-%d")
+        return scores.to_dict(orient="records")
+
+
+def serve(scorer, host="127.0.0.1", port=8765):
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                body, status = json.dumps(scorer.handle(request)), 200
+            except Exception as e:
+                body, status = json.dumps({"error": str(e)}), 400
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+    print(f"Scoring on http://{host}:{port}")
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+# Worker reading one json request per line on stdin and writing one json
+# response per line on stdout
+def work(scorer):
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            response = scorer.handle(json.loads(line))
+        except Exception as e:
+            response = {"error": str(e)}
+        print(json.dumps(response), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score statement rows with the trained model")
+    parser.add_argument("dataset", nargs="?", default="data_clean")
+    parser.add_argument("--start", help="first date of the rows to score")
+    parser.add_argument("--end", help="date after the rows to score")
+    parser.add_argument("--output", default="models/scores.parquet")
+    parser.add_argument("--model",
+                        help="saved model, models/model with the extension of its backend by default")
+    parser.add_argument("--preprocessor", default="models/preprocessor.pkl")
+    parser.add_argument("--batch-size", type=int, default=65536)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--serve", action="store_true",
+                        help="keep the model loaded and score http requests")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--worker", action="store_true",
+                        help="keep the model loaded and score json lines of stdin")
+    args = parser.parse_args()
+
+    scorer = Scorer.load(args.model, args.preprocessor, args.batch_size,
+                         args.threads)
+    if args.serve:
+        serve(scorer, port=args.port)
+    elif args.worker:
+        work(scorer)
+    else:
+        scores = scorer.score_dataset(args.dataset, args.start, args.end)
+        scores.to_parquet(args.output, index=False)
+        print(f"{len(scores)} rows scored in {args.output}")
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from pytorch_tabnet.callbacks import Callback
+
+import storage
+from config import FEATURES, TARGET
+from dataset import EncodedDataset
+from preprocessor import TabularPreprocessor
+
+# Searched parameters: log-uniform and uniform ranges or choices
+SPACE = {
+    "lr": ("log", 1e-3, 5e-2),
+    "step_size": ("choice", [5, 10, 20]),
+    "gamma": ("uniform", 0.8, 0.99),
+    "mask_type": ("choice", ["entmax", "sparsemax"]),
+    "cat_emb_dim": ("choice", [1, 2, 4]),
+    "n_d": ("choice", [8, 16, 32]),
+    "n_steps": ("choice", [3, 5, 7]),
+    "batch_size": ("choice", [512, 1024, 2048]),
+    "virtual_batch_size": ("choice", [64, 128, 256]),
+    "max_epochs": ("choice", [30, 50, 80]),
+}
+# Parameters of the fit, the others are parameters of the model
+FIT_PARAMS = ["batch_size", "virtual_batch_size", "max_epochs"]
+# Parameters of the best trial, read by 4_model.py
+BEST = "models/search_best.json"
+
+
+# Parameters of a trial, drawn from its number so that a resumed search
+# draws the same trials
+def sample(number, seed=0, space=SPACE):
+    rng = np.random.default_rng([seed, number])
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))))
+        elif kind == "uniform":
+            params[name] = float(rng.uniform(*args))
+        else:
+            params[name] = args[0][rng.integers(len(args[0]))]
+    params["n_a"] = params.get("n_d", 8)
+    return params
+
+
+# Model and fit parameters of a trial
+def split_params(params):
+    return ({a: b for a, b in params.items() if a not in FIT_PARAMS},
+            {a: b for a, b in params.items() if a in FIT_PARAMS})
+
+
+# Time ordered folds: the distinct dates are cut into n_folds + 1 blocks,
+# each fold validating on a block and training on the rows dated at least
+# purge years before it, as the target is known one year after the date
+def time_folds(dates, n_folds=4, purge=1):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    blocks = np.array_split(np.unique(dates), n_folds + 1)
+    folds = []
+    for block in blocks[1:]:
+        if len(block) == 0:
+            continue
+        end = pd.Timestamp(block[0]) - pd.DateOffset(years=purge)
+        train = np.flatnonzero(dates <= np.datetime64(end, "D"))
+        valid = np.flatnonzero((dates >= block[0]) & (dates <= block[-1]))
+        if len(train) and len(valid):
+            folds.append((train, valid))
+    return folds
+
+
+# Trials of the searches with their AUC after each epoch of each fold,
+# shared by the workers, and the key of the parameters of each search
+class TrialStore:
+
+    def __init__(self, path="models/search.sqlite"):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS searches ("
+                                "search TEXT PRIMARY KEY, key TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS trials ("
+                                "search TEXT, number INTEGER, params TEXT, "
+                                "state TEXT, value REAL, "
+                                "PRIMARY KEY (search, number))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS epochs ("
+                                "search TEXT, number INTEGER, fold INTEGER, "
+                                "epoch INTEGER, value REAL, "
+                                "PRIMARY KEY (search, number, fold, epoch))")
+        self.connection.commit()
+
+    # A search is only resumed with the seed and space it was started with,
+    # as its done trials were drawn from them
+    def check(self, search, key):
+        with self.connection:
+            row = self.connection.execute("SELECT key FROM searches "
+                                          "WHERE search = ?", (search,)).fetchone()
+            if row is None:
+                self.connection.execute("INSERT INTO searches VALUES (?, ?)",
+                                        (search, key))
+            elif row[0] != key:
+                raise ValueError(f"The search {search} was started with another "
+                                 "seed, space or folds, resume it with the same "
+                                 "ones or give it another name")
+
+    def start(self, search, number, params):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO trials "
+                                    "VALUES (?, ?, ?, 'running', NULL)",
+                                    (search, number, json.dumps(params)))
+            self.connection.execute("DELETE FROM epochs "
+                                    "WHERE search = ? AND number = ?",
+                                    (search, number))
+
+    def report(self, search, number, fold, epoch, value):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO epochs "
+                                    "VALUES (?, ?, ?, ?, ?)",
+                                    (search, number, fold, epoch, value))
+
+    def finish(self, search, number, state, value):
+        with self.connection:
+            self.connection.execute("UPDATE trials SET state = ?, value = ? "
+                                    "WHERE search = ? AND number = ?",
+                                    (state, value, search, number))
+
+    # Trials completed or pruned, the interrupted ones are run again
+    def done(self, search):
+        cursor = self.connection.execute("SELECT number FROM trials "
+                                         "WHERE search = ? "
+                                         "AND state IN ('complete', 'pruned')",
+                                         (search,))
+        return {row[0] for row in cursor}
+
+    # Median pruning: a trial is stopped when its value at an epoch of a fold
+    # is below the median of the values of the other trials at that epoch
+    def should_prune(self, search, number, fold, epoch, value, min_trials=4):
+        cursor = self.connection.execute("SELECT value FROM epochs "
+                                         "WHERE search = ? AND number != ? "
+                                         "AND fold = ? AND epoch = ?",
+                                         (search, number, fold, epoch))
+        others = [row[0] for row in cursor]
+        return len(others) >= min_trials and value < np.median(others)
+
+    def trials(self, search):
+        df = pd.read_sql_query("SELECT number, params, state, value FROM trials "
+                               "WHERE search = ? ORDER BY number",
+                               self.connection, params=(search,))
+        return pd.concat([df.drop(columns="params"),
+                          pd.DataFrame([json.loads(a) for a in df.params])], axis=1)
+
+    def best(self, search):
+        row = self.connection.execute("SELECT params, value FROM trials "
+                                      "WHERE search = ? AND state = 'complete' "
+                                      "ORDER BY value DESC LIMIT 1",
+                                      (search,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+    def close(self):
+        self.connection.close()
+
+
+# Reports the value of a trial after each epoch of a fold, the mean of the
+# best validation AUC of the previous folds and of the current one so far,
+# and stops the training when the trial is pruned. The first warmup epochs
+# of a fold are never pruned.
+class Pruning(Callback):
+
+    def __init__(self, store, search, number, fold, values, warmup=5):
+        super().__init__()
+        self.store = store
+        self.search = search
+        self.number = number
+        self.fold = fold
+        self.values = list(values)
+        self.warmup = warmup
+        self.best = -np.inf
+        self.pruned = False
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.best = max(self.best, logs["valid_auc"])
+        value = float(np.mean(self.values + [self.best]))
+        self.store.report(self.search, self.number, self.fold, epoch, value)
+        if epoch >= self.warmup and self.store.should_prune(
+                self.search, self.number, self.fold, epoch, value):
+            self.pruned = True
+            self.trainer._stop_training = True
+
+
+# Encoded dataset of each fold, with a preprocessor fitted on the training
+# rows of the fold only. The training rows come first, then the validation
+# rows.
+def build_folds(data, path, n_folds=4, purge=1):
+    folds = []
+    for fold, (train, valid) in enumerate(time_folds(data.date, n_folds, purge)):
+        preprocessor = TabularPreprocessor(FEATURES, TARGET).fit(data.iloc[train])
+        folder = os.path.join(path, str(fold))
+        EncodedDataset.build(data.iloc[np.concatenate([train, valid])],
+                             preprocessor, folder)
+        folds.append({"path": folder, "train": len(train), "valid": len(valid),
+                      "cat_idxs": preprocessor.cat_idxs,
+                      "cat_dims": preprocessor.cat_dims})
+    return folds
+
+
+# Folds and store of each worker, opened once per process
+_worker = {}
+
+
+def _init_worker(threads, folds, store):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    _worker["folds"] = [(EncodedDataset.open(a["path"]),
+                         np.arange(a["train"]),
+                         np.arange(a["train"], a["train"] + a["valid"]),
+                         a["cat_idxs"], a["cat_dims"])
+                        for a in folds]
+    _worker["store"] = TrialStore(store)
+
+
+# Fit the model of a trial on each fold, reporting its validation AUC after
+# each epoch and stopping as soon as the trial is pruned
+def run_trial(search, number, params, patience=10, warmup=5):
+    from backends import TabNetBackend, make_classifier
+    folds, store = _worker["folds"], _worker["store"]
+    store.start(search, number, params)
+    model_params, fit_params = split_params(params)
+    values = []
+    for fold, (dataset, train, valid, cat_idxs, cat_dims) in enumerate(folds):
+        pruning = Pruning(store, search, number, fold, values, warmup)
+        clf = make_classifier(cat_idxs, cat_dims, TabNetBackend,
+                              seed=number, verbose=0, **model_params)
+        clf.fit_dataset(dataset, train,
+                        eval_set=[valid],
+                        eval_name=['valid'],
+                        eval_metric=['auc'],
+                        patience=patience,
+                        num_workers=0,
+                        drop_last=False,
+                        compute_importance=False,
+                        callbacks=[pruning],
+                        **fit_params)
+        values.append(pruning.best)
+        if pruning.pruned:
+            store.finish(search, number, "pruned", np.mean(values))
+            return number, "pruned", np.mean(values)
+    store.finish(search, number, "complete", np.mean(values))
+    return number, "complete", np.mean(values)
+
+
+# Key of the parameters and of the content of the dataset (its file hash)
+# the trials of a search depend on
+def search_key(seed, space, n_folds, purge, patience, warmup, dataset):
+    params = {"seed": seed, "space": space, "n_folds": n_folds, "purge": purge,
+              "patience": patience, "warmup": warmup, "dataset": dataset}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def save_best(params, value, search, path=BEST):
+    with open(path, "w") as f:
+        json.dump({"search": search, "value": value, "params": params}, f,
+                  indent=2)
+
+
+# Parameters of the best trial, None before any search
+def load_best(path=BEST):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["params"]
+
+
+# Run the trials of a search not already in the store, in parallel, and save
+# the parameters of the best trial
+def run(search="tabnet", trials=50, workers=4, threads=1, n_folds=4, purge=1,
+        seed=0, patience=10, path="data/encoded_search", store="models/search.sqlite",
+        space=SPACE, warmup=5, best=BEST):
+    TrialStore(store).check(search, search_key(seed, space, n_folds, purge,
+                                               patience, warmup,
+                                               storage.file_hash("data_clean")))
+    folds = build_folds(storage.read("data_clean"), path, n_folds, purge)
+    done = TrialStore(store).done(search)
+    todo = [a for a in range(trials) if a not in done]
+    print(f"{len(done)} trials done, {len(todo)} to run")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(threads, folds, store)) as pool:
+        futures = [pool.submit(run_trial, search, number, sample(number, seed, space),
+                               patience, warmup)
+                   for number in todo]
+        for future in as_completed(futures):
+            number, state, value = future.result()
+            print(f"trial {number}: {state} ({value:.4f})")
+    params, value = TrialStore(store).best(search)
+    if params is not None:
+        save_best(params, value, search, best)
+    return params, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the TabNet parameters")
+    parser.add_argument("--name", default="tabnet", help="name of the search")
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=1,
+                        help="torch threads of each trial")
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--purge", type=int, default=1,
+                        help="years between the train and validation rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store", default="models/search.sqlite")
+    parser.add_argument("--best", default=BEST,
+                        help="file of the best parameters, read by 4_model.py")
+    args = parser.parse_args()
+
+    params, value = run(args.name, args.trials, args.workers, args.threads,
+                        args.folds, args.purge, args.seed, store=args.store,
+                        best=args.best)
+    print(f"Best AUC {value}: {params}")
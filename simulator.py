@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+# Rebalancing calendars, as pandas periods
+CALENDARS = {"daily": "D", "weekly": "W", "monthly": "M", "quarterly": "Q"}
+
+
+# Mask of the rebalancing days: first day of each period of a calendar, or
+# the given dates. The first day is always a rebalancing day.
+def rebalance_days(dates, calendar="monthly"):
+    dates = pd.DatetimeIndex(dates)
+    if isinstance(calendar, str):
+        mask = ~dates.to_period(CALENDARS[calendar]).duplicated()
+    else:
+        mask = dates.isin(pd.DatetimeIndex(calendar))
+    mask[:1] = True
+    return mask
+
+
+# Portfolio rebalanced to target weights (days x tickers) on the rebalancing
+# days, the holdings drifting with the returns in between. The weights of a
+# rebalancing day apply to the returns of that day, as in
+# weighting.portfolio_returns, the rest of the portfolio being kept in cash.
+# Costs and slippage are fractions of the traded value, paid on each
+# rebalancing. All the days are computed at once: the growth of the holdings
+# since the last rebalancing comes from cumulative sums of log returns reset
+# on each rebalancing.
+def simulate(weights, returns, calendar="monthly", cost=0.0, slippage=0.0):
+    w = np.nan_to_num(np.asarray(weights, dtype=float))
+    r = np.nan_to_num(np.asarray(returns, dtype=float))
+    index = returns.index if isinstance(returns, pd.DataFrame) else None
+    if index is not None:
+        mask = rebalance_days(index, calendar)
+    else:
+        mask = np.array(calendar, dtype=bool)
+        mask[:1] = True
+    starts = np.flatnonzero(mask)
+    start = starts[np.cumsum(mask) - 1]
+
+    # Holdings value per unit of wealth at the last rebalancing
+    log_growth = np.zeros((len(r) + 1, r.shape[1]))
+    np.cumsum(np.log1p(np.maximum(r, -1 + 1e-12)), axis=0, out=log_growth[1:])
+    target = w[start]
+    holdings = target * np.exp(log_growth[1:] - log_growth[start])
+    value = 1 - target.sum(axis=1) + holdings.sum(axis=1)
+
+    # Traded value on each rebalancing, from the drifted weights of the day
+    # before (from cash on the first day)
+    drifted = np.zeros_like(w[starts])
+    drifted[1:] = holdings[starts[1:] - 1] / value[starts[1:] - 1, None]
+    traded = np.zeros(len(r))
+    traded[starts] = np.abs(w[starts] - drifted).sum(axis=1)
+    costs = traded * cost
+    slippages = traded * slippage
+
+    previous = np.ones(len(r))
+    previous[1:] = value[:-1]
+    previous[starts] = 1
+    net = value / previous * (1 - costs - slippages) - 1
+    result = pd.DataFrame({"returns": net,
+                           "gross_returns": value / previous - 1,
+                           "turnover": traded / 2,
+                           "costs": costs,
+                           "slippage": slippages,
+                           "value": np.cumprod(1 + net),
+                           "rebalance": mask}, index=index)
+    return result
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Columns statement-level datasets share
+STATEMENT_DATES = ['date']
+DATA_DATES = ['date', 'date_price', 'date_price_previous', 'date_price_next',
+              'date_ref', 'date_ref_previous', 'date_ref_next']
+
+# Typed schema of each dataset: date columns (the first one is used for
+# date range filters) and string columns, other columns are numeric
+SCHEMAS = {
+    "prices_daily": {"dates": ['Date'], "strings": []},
+    "dividends": {"dates": ['Date'], "strings": []},
+    "prices_updates": {"dates": ['date'], "strings": ['symbol']},
+    "incomeStatementHistory": {"dates": STATEMENT_DATES, "strings": ['symbol']},
+    "balanceSheetHistory": {"dates": STATEMENT_DATES, "strings": ['symbol']},
+    "cashflowStatementHistory": {"dates": STATEMENT_DATES, "strings": ['symbol']},
+    "shares": {"dates": ['date'], "strings": ['symbol']},
+    "data": {"dates": DATA_DATES, "strings": ['symbol', 'sector']},
+    "data_clean": {"dates": ['date'], "strings": ['symbol', 'sector']},
+    "data_evol_clean": {"dates": ['date'], "strings": ['symbol', 'sector']},
+    "probas": {"dates": ['date_start', 'date_end'], "strings": ['symbol']},
+}
+
+
+def path(dataset, project=None, root="data", ext="parquet"):
+    folder = root if project is None else f"{root}/{project}"
+    return f"{folder}/{dataset}.{ext}"
+
+
+def exists(dataset, project=None, root="data"):
+    return (os.path.exists(path(dataset, project, root))
+            or os.path.exists(path(dataset, project, root, "csv")))
+
+
+# Content hash of the stored file of a dataset, parquet or legacy csv
+def file_hash(dataset, project=None, root="data"):
+    file = path(dataset, project, root)
+    if not os.path.exists(file):
+        file = path(dataset, project, root, "csv")
+    h = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# Cast the columns of a dataframe to the schema of its dataset, raises a
+# ValueError on an undeclared column that is not numeric
+def apply_schema(df, dataset):
+    if dataset not in SCHEMAS:
+        return df
+    schema = SCHEMAS[dataset]
+    for col in schema["dates"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in schema["strings"]:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
+    # Other columns must hold numbers, possibly as strings
+    for col in df.columns.difference(schema["dates"] + schema["strings"]):
+        if df[col].dtype == object or isinstance(df[col].dtype, pd.StringDtype):
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"Column {col} of {dataset} is not numeric, "
+                                 "declare it in SCHEMAS") from e
+    return df
+
+
+# Write a dataset as parquet, with an optional csv export
+def write(df, dataset, project=None, root="data", csv=False):
+    schema = SCHEMAS.get(dataset, {"dates": []})
+    if df.index.name is not None and df.index.name in schema["dates"]:
+        df = df.reset_index()
+    df = apply_schema(df.reset_index(drop=True), dataset)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path(dataset, project, root))
+    if csv:
+        df.to_csv(path(dataset, project, root, "csv"), index=False)
+
+
+# Read a dataset with column projection and date range pushdown
+# (start <= date < end). Falls back on the legacy csv file.
+def read(dataset, project=None, root="data", columns=None, start=None,
+         end=None):
+    schema = SCHEMAS.get(dataset, {"dates": []})
+    date = schema["dates"][0] if schema["dates"] else None
+    filters = []
+    if start is not None:
+        filters.append((date, ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append((date, "<", pd.Timestamp(end)))
+    file = path(dataset, project, root)
+    if os.path.exists(file):
+        table = pq.read_table(file, columns=columns, filters=filters or None,
+                              memory_map=True)
+        return apply_schema(table.to_pandas(), dataset)
+    usecols = None if columns is None else list(dict.fromkeys(columns + schema["dates"][:1]))
+    df = apply_schema(pd.read_csv(path(dataset, project, root, "csv"),
+                                  usecols=usecols), dataset)
+    if start is not None:
+        df = df[df[date] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[date] < pd.Timestamp(end)]
+    if columns is not None:
+        df = df[columns]
+    return df.reset_index(drop=True)
+
+
+# Wide (Date x ticker) dataset indexed by date
+def read_wide(dataset, project=None, root="data", columns=None, start=None,
+              end=None):
+    if columns is not None:
+        columns = ['Date'] + [a for a in columns if a != 'Date']
+    df = read(dataset, project, root, columns, start, end)
+    return df.set_index('Date')
+
+
+# Dense (dates x tickers) matrix saved as .npy files, read back memory
+# mapped so that several processes share the same pages
+def write_matrix(values, dates, tickers, dataset, root="data"):
+    np.save(path(dataset, None, root, "npy"), np.ascontiguousarray(values))
+    np.save(path(f"{dataset}_dates", None, root, "npy"),
+            np.asarray(dates, dtype="datetime64[ns]"))
+    np.save(path(f"{dataset}_tickers", None, root, "npy"),
+            np.asarray(tickers, dtype=str))
+
+
+def read_matrix(dataset, root="data", mmap_mode="r"):
+    values = np.load(path(dataset, None, root, "npy"), mmap_mode=mmap_mode)
+    dates = pd.DatetimeIndex(np.load(path(f"{dataset}_dates", None, root, "npy")),
+                             name='Date')
+    tickers = pd.Index(np.load(path(f"{dataset}_tickers", None, root, "npy")).astype(object))
+    return values, dates, tickers
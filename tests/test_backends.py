@@ -0,0 +1,64 @@
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+from pytorch_tabnet.callbacks import LRSchedulerCallback
+
+import backends
+from score import Scorer
+
+
+def data(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.integers(0, 4, rows), rng.normal(size=rows),
+                         rng.normal(size=rows)])
+    y = (X[:, 1] + 0.1 * rng.normal(size=rows) > 0).astype(float)
+    return X, y
+
+
+def test_gradient_boosting_permutation_importances():
+    X, y = data()
+    clf = backends.make_backend("hgb", [0], [4], max_iter=20).fit(X, y)
+    importances = clf.feature_importances_
+    assert importances.shape == (3,)
+    assert importances.sum() == pytest.approx(1)
+    assert np.argmax(importances) == 1
+
+
+def test_scorer_loads_the_latest_saved_model(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("models")
+    with pytest.raises(FileNotFoundError):
+        backends.saved_model()
+    X, y = data()
+    backends.make_backend("logistic", [0], [4]).fit(X, y).save("models/model.pkl")
+    assert backends.saved_model() == "models/model.pkl"
+    open("models/model.zip", "wb").close()
+    past = time.time() - 60
+    os.utime("models/model.zip", (past, past))
+    assert backends.saved_model() == "models/model.pkl"
+
+    clf = backends.make_backend("logistic", [0], [4]).fit(X, y)
+    clf.save("models/model.pkl")
+    with open("models/preprocessor.pkl", "wb") as f:
+        pickle.dump(None, f)
+    scorer = Scorer.load()
+    np.testing.assert_allclose(scorer.predict(X), clf.predict_proba(X)[:, 1], rtol=1e-6)
+
+
+def test_warm_start_keeps_the_scheduler(tmp_path):
+    X, y = data()
+    clf = backends.make_backend("tabnet", [0], [4], n_d=4, n_a=4, n_steps=1)
+    clf.fit(X, y, max_epochs=1, batch_size=128, virtual_batch_size=64)
+    clf.save(str(tmp_path / "model.zip"))
+    assert backends.load(str(tmp_path / "model.zip")).scheduler_fn is None
+    fresh = backends.make_backend("tabnet", [0], [4], n_d=4, n_a=4, n_steps=1,
+                                  lr=0.05)
+    warm = backends.load_warm(str(tmp_path / "model.zip"), fresh)
+    warm.fit(X, y, max_epochs=1, batch_size=128, virtual_batch_size=64,
+             warm_start=True)
+    callbacks = warm._callback_container.callbacks
+    assert any(isinstance(a, LRSchedulerCallback) for a in callbacks)
+    assert warm._optimizer.defaults["lr"] == 0.05
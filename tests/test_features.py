@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import LAG_TRANSFORMS, FeatureSet, add_lags
+
+
+def test_derived_variables_are_reused():
+    features = FeatureSet({"a": "x + y", "b": "a * 2", "c": "a > b"})
+    assert features.inputs == ["x", "y"]
+    assert features.compiled["b"] == "v0 * 2"
+    data = pd.DataFrame({"x": [1.0, -2.0], "y": [2.0, 0.0]})
+    result = FeatureSet(features.expressions).evaluate(data)
+    assert result.a.tolist() == [3.0, -2.0]
+    assert result.b.tolist() == [6.0, -4.0]
+    assert result.c.tolist() == [False, True]
+
+
+def test_dates_as_days():
+    features = FeatureSet({"days": "end - start"})
+    data = pd.DataFrame({"start": pd.to_datetime(["2021-01-01", None]),
+                         "end": pd.to_datetime(["2021-01-08", "2021-01-08"])})
+    days = features.evaluate(data)["days"].to_numpy()
+    assert days[0] == 7 and np.isnan(days[1])
+
+
+# Lagged value from a loop over the dates of the symbol, the last row of a
+# duplicated (symbol, date) giving its value
+def brute_lag(data, feature, row, lag):
+    values = {}
+    for symbol, date, value in zip(data.symbol, data.date, data[feature]):
+        if symbol == data.symbol[row]:
+            values[date] = value
+    dates = sorted(values)
+    k = dates.index(data.date[row]) - lag
+    return values[dates[k]] if k >= 0 else np.nan
+
+
+@pytest.mark.parametrize("transform", sorted(LAG_TRANSFORMS))
+def test_add_lags_matches_loop(transform):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "symbol": rng.choice(["A", "B", "C"], 60),
+        "date": pd.Timestamp("2015-12-31")
+        + pd.to_timedelta(rng.integers(0, 10, 60) * 365, unit="D"),
+        "x": rng.normal(size=60),
+        "y": np.where(rng.random(60) < 0.2, np.nan, rng.normal(size=60)),
+    })
+    result = add_lags(data, ["x", "y"], lags=(1, 2), transforms=[transform])
+    assert result.index.equals(data.index)
+    for lag in (1, 2):
+        for feature in ["x", "y"]:
+            lagged = np.array([brute_lag(data, feature, i, lag)
+                               for i in range(len(data))])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                expected = LAG_TRANSFORMS[transform](data[feature].to_numpy(),
+                                                     lagged)
+            np.testing.assert_allclose(result[f"{feature}_{transform}{lag}"],
+                                       expected)
@@ -0,0 +1,108 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pandas as pd
+import pytest
+import requests
+
+from fetch import Fetcher
+
+DAY = 86400
+CHART = {"chart": {"error": None, "result": [{
+    "meta": {"gmtoffset": -14400},
+    "timestamp": [1609770600, 1609770600 + DAY, 1609770600 + 2 * DAY],
+    "indicators": {"quote": [{"open": [1, 2, 3], "high": [1, 2, 3],
+                              "low": [1, 2, 3], "close": [1, 2, 3],
+                              "volume": [10, 20, 30]}],
+                   "adjclose": [{"adjclose": [0.5, 1, 1.5]}]},
+    "events": {"dividends": {"1609857000": {"amount": 0.25,
+                                            "date": 1609770600 + DAY}}}}]}}
+TIMESERIES = {"timeseries": {"result": [
+    {"meta": {"type": ["annualNetIncome"]}, "timestamp": [1],
+     "annualNetIncome": [{"asOfDate": "2020-12-31",
+                          "reportedValue": {"raw": 5.0}}, None]},
+    {"meta": {"type": ["annualEBIT"]}, "timestamp": [1],
+     "annualEBIT": [{"asOfDate": "2020-12-31", "reportedValue": {"raw": 7.0}}]}]}}
+
+
+# Local Yahoo stub recording the requested paths
+@pytest.fixture
+def server():
+    paths = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            paths.append(self.path)
+            body = CHART if self.path.startswith("/v8/finance/chart/") else TIMESERIES
+            content = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", paths
+    httpd.shutdown()
+
+
+def test_endpoints_use_base_url(server):
+    base_url, paths = server
+    fetcher = Fetcher(workers=2, rate=100, burst=10, base_url=base_url)
+    prices = fetcher.prices("MSFT", start="2021-01-04", actions=True)
+    assert list(prices.index) == list(pd.date_range("2021-01-04", periods=3))
+    assert prices["Adj Close"].tolist() == [0.5, 1, 1.5]
+    assert prices["Dividends"].tolist() == [0, 0.25, 0]
+    statements = fetcher.statements("msft")
+    assert statements["incomeStatementHistory"] == [
+        {"netIncome": 5.0, "ebit": 7.0, "date": "2020-12-31", "symbol": "MSFT"}]
+    assert fetcher.shares("MSFT").symbol.tolist() == ["MSFT"]
+    assert len(paths) == 5
+    assert all(a.startswith(("/v8/finance/chart/MSFT",
+                             "/ws/fundamentals-timeseries/")) for a in paths)
+
+
+def test_map_ticker_order_and_failures():
+    fetcher = Fetcher(workers=4, rate=1000, burst=100, retries=0)
+    seen = []
+
+    def func(ticker):
+        if ticker == "B":
+            raise ValueError("no data")
+        return ticker.lower()
+
+    results, failures = fetcher.map(func, ["D", "C", "B", "A"],
+                                    callback=lambda a, r: seen.append(a))
+    assert list(results.items()) == [("D", "d"), ("C", "c"), ("A", "a")]
+    assert [a for a, e in failures] == ["B"]
+    assert isinstance(failures[0][1], ValueError)
+    assert sorted(seen) == ["A", "C", "D"]
+
+
+def test_retry_only_transient_errors(monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda delay: None)
+    fetcher = Fetcher(retries=3, rate=1000, burst=100)
+    calls = []
+
+    def failing(error):
+        calls.append(error)
+        raise error
+
+    def http_error(status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.HTTPError(response=response)
+
+    for error, attempts in [(http_error(404), 1), (ValueError("no data"), 1),
+                            (http_error(503), 4), (http_error(429), 4),
+                            (requests.ConnectionError(), 4)]:
+        calls.clear()
+        with pytest.raises(type(error)):
+            fetcher.call(failing, error)
+        assert len(calls) == attempts
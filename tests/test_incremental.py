@@ -0,0 +1,72 @@
+import pandas as pd
+
+import storage
+from incremental import (clear_updates, delta_starts, merge_downloads,
+                         read_updates, write_updates)
+
+
+def history(start, closes, dividends=None):
+    index = pd.date_range(start, periods=len(closes), name="Date")
+    return pd.DataFrame({"Adj Close": closes,
+                         "Dividends": dividends or [0.0] * len(closes)},
+                        index=index)
+
+
+def test_empty_todo_keeps_stores():
+    prices_old = pd.DataFrame({"A": [1.0, 2.0]},
+                              index=pd.date_range("2021-01-04", periods=2, name="Date"))
+    prices, dividends, updates = merge_downloads({}, prices_old, prices_old * 0)
+    assert prices is prices_old
+    assert updates.empty
+
+
+def test_empty_deltas_and_first_run(tmp_path):
+    empty = history("2021-01-04", [])
+    prices, dividends, updates = merge_downloads({"A": (empty, False)})
+    assert prices is None and dividends is None
+    # The empty updates are stored so that the previous ones are not reused
+    storage.write(updates, "prices_updates", root=str(tmp_path))
+    assert storage.read("prices_updates", root=str(tmp_path)).empty
+
+
+def test_delta_merged_into_old_stores():
+    old = history("2021-01-04", [1.0, 2.0])
+    prices_old = old[["Adj Close"]].rename(columns={"Adj Close": "A"})
+    dividends_old = old[["Dividends"]].rename(columns={"Dividends": "A"})
+    downloads = {"A": (history("2021-01-06", [3.0]), False),
+                 "B": (history("2021-01-04", [5.0, 6.0, 7.0], [0.0, 1.0, 0.0]), True)}
+    prices, dividends, updates = merge_downloads(downloads, prices_old, dividends_old)
+    assert prices.A.tolist() == [1.0, 2.0, 3.0]
+    assert prices.B.tolist() == [5.0, 6.0, 7.0]
+    assert dividends.B.tolist() == [0.0, 1.0, 0.0]
+    assert dict(zip(updates.symbol, updates.date)) == {
+        "A": pd.Timestamp("2021-01-06"), "B": pd.Timestamp("2021-01-04")}
+
+
+def test_updates_merged_until_cleared(tmp_path):
+    root = str(tmp_path)
+    (tmp_path / "p").mkdir()
+    write_updates("p", pd.DataFrame({"symbol": ["A", "B"],
+                                     "date": pd.to_datetime(["2021-01-06", "2021-01-04"])}), root)
+    write_updates("p", pd.DataFrame({"symbol": ["A", "C"],
+                                     "date": pd.to_datetime(["2021-01-05", "2021-01-07"])}), root)
+    write_updates("p", merge_downloads({})[2], root)
+    updates = read_updates("p", root)
+    assert dict(zip(updates.symbol, updates.date)) == {
+        "A": pd.Timestamp("2021-01-05"), "B": pd.Timestamp("2021-01-04"),
+        "C": pd.Timestamp("2021-01-07")}
+    clear_updates("p", root)
+    assert read_updates("p", root).empty
+
+
+def test_delta_overwrites_last_stored_close():
+    old = history("2021-01-04", [1.0, 2.0])
+    prices_old = old[["Adj Close"]].rename(columns={"Adj Close": "A"})
+    start = delta_starts(prices_old)["A"]
+    assert start == pd.Timestamp("2021-01-05")
+    # The partial close of the last session is replaced by the final one
+    downloads = {"A": (history(start, [2.5, 3.0]), False)}
+    dividends_old = old[["Dividends"]].rename(columns={"Dividends": "A"})
+    prices, dividends, updates = merge_downloads(downloads, prices_old, dividends_old)
+    assert prices.A.tolist() == [1.0, 2.5, 3.0]
+    assert updates.date.tolist() == [start]
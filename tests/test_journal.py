@@ -0,0 +1,26 @@
+from journal import Journal
+
+
+def test_clear_after_compaction_refreshes_tickers(tmp_path):
+    journal = Journal(str(tmp_path / "journal.sqlite"))
+    journal.append("p", "shares", "A", {"shares": [{"value": 1}]})
+    journal.append("p", "shares", "B", {"shares": [{"value": 2}]})
+    assert journal.done("p", "shares") == {"A", "B"}
+    assert journal.compact("p", "shares")["shares"].value.tolist() == [1, 2]
+
+    journal.clear("p", "shares")
+    assert journal.done("p", "shares") == set()
+    journal.append("p", "shares", "A", {"shares": [{"value": 3}]})
+    assert journal.compact("p", "shares")["shares"].value.tolist() == [3]
+    journal.close()
+
+
+def test_resume_skips_journaled_tickers(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    journal = Journal(path)
+    journal.append("p", "statements", "A", {"income": [{"x": 1}]})
+    journal.close()
+    journal = Journal(path)
+    assert journal.done("p", "statements") == {"A"}
+    assert journal.done("p", "shares") == set()
+    journal.close()
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import pipeline
+
+
+def test_default_stages():
+    assert pipeline.parse_args([]).stages == list(pipeline.STAGES)
+
+
+def test_selected_stages():
+    args = pipeline.parse_args(["model", "--force"])
+    assert args.stages == ["model"]
+    assert args.force
+    assert pipeline.plan(args.stages) == ["get_data", "preprocess",
+                                          "feature_eng", "model"]
+
+
+def test_unknown_stage():
+    with pytest.raises(SystemExit):
+        pipeline.parse_args(["train"])
+
+
+# The peak memory is the one of each stage, not the largest one so far. The
+# stages are run from a new interpreter as the peak of a child includes the
+# memory of its parent when it was started.
+def test_stage_peak_memory(tmp_path):
+    big, small = tmp_path / "big.py", tmp_path / "small.py"
+    big.write_text("data = b'1' * (300 * 2 ** 20)\n")
+    small.write_text("pass\n")
+    code = ("import pipeline; "
+            f"print(pipeline.run_stage({{'script': {str(big)!r}}})[1], "
+            f"pipeline.run_stage({{'script': {str(small)!r}}})[1])")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root,
+                            capture_output=True, text=True, check=True).stdout
+    big_peak, small_peak = map(float, output.split())
+    assert big_peak > 300
+    assert small_peak < big_peak - 200
+
+
+def test_failed_stage(tmp_path):
+    script = tmp_path / "fail.py"
+    script.write_text("raise SystemExit(3)\n")
+    with pytest.raises(RuntimeError, match="3"):
+        pipeline.run_stage({"script": str(script)})
+
+
+def test_model_outputs_follow_the_backend():
+    import backends
+    assert pipeline.MODEL_EXTENSIONS == {name: cls.extension
+                                         for name, cls in backends.BACKENDS.items()}
+    assert "models/preprocessor.pkl" in pipeline.STAGES["model"]["outputs"]
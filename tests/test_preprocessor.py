@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessor import TabularPreprocessor
+from utils import process_data
+
+
+def frame(sectors, values, target):
+    return pd.DataFrame({"sector": sectors, "value": values, "target": target})
+
+
+def test_unseen_categories_get_the_unknown_code():
+    preprocessor = TabularPreprocessor(["sector", "value"], "target")
+    preprocessor.fit(frame(["b", "a", None], [1.0, 2.0, 3.0], [0, 1, 0]))
+    assert preprocessor.categories["sector"] == ["Unknown", "a", "b"]
+    assert preprocessor.cat_dims[0] == 4
+    X = preprocessor.transform(frame(["a", "c", None, "b"], [1.0] * 4, [0] * 4))
+    assert X[:, 0].tolist() == [2, 0, 1, 3]
+
+
+def test_partial_fit_keeps_the_codes():
+    preprocessor = TabularPreprocessor(["sector", "value"], "target")
+    preprocessor.fit(frame(["b", "a"], [1.0, 2.0], [0, 1]))
+    preprocessor.partial_fit(frame(["c"], [3.0], [1]))
+    X = preprocessor.transform(frame(["a", "b", "c", "d"], [1.0] * 4, [0] * 4))
+    assert X[:, 0].tolist() == [1, 2, 3, 0]
+    assert preprocessor.cat_dims[0] == 4
+
+
+def test_target_is_not_shifted():
+    preprocessor = TabularPreprocessor(["sector", "value"], "target")
+    preprocessor.fit(frame(["a", "b"], [1.0, 2.0], [0, 1]))
+    assert preprocessor.transform_target(frame(["a"] * 2, [1.0] * 2, [1, 0])).tolist() == [1, 0]
+    with pytest.raises(ValueError):
+        preprocessor.transform_target(frame(["a"], [1.0], [2]))
+
+
+def test_process_data_transforms_the_requested_splits():
+    dates = pd.date_range("2020-01-01", periods=6, freq="MS")
+    df = frame(list("abcabc"), np.arange(6.0), [0, 1] * 3).assign(date=dates)
+    preprocessor = TabularPreprocessor(["sector", "value"], "target").fit(df)
+    _, X_train, y_train, X_valid, _, X_test, _, indices = process_data(
+        df, dates[2], dates[4], ["sector", "value"], "target", preprocessor,
+        "logistic", splits=["train"])
+    assert X_train.shape == (3, 2) and y_train.tolist() == [0, 1, 0]
+    assert X_valid.shape == (0, 2) and X_test.shape == (0, 2)
+    assert indices.tolist() == ["train"] * 3 + ["valid"] * 2 + ["test"]
+
+
+def test_process_data_fits_without_the_test_rows():
+    dates = pd.date_range("2020-01-01", periods=6, freq="MS")
+    df = frame(list("ababcd"), np.arange(6.0), [0, 1] * 3).assign(date=dates)
+    _, X_train, _, X_valid, _, X_test, _, _ = process_data(
+        df, dates[2], dates[3], ["sector", "value"], "target",
+        backend="logistic")
+    # The sectors and values of the test rows are unseen by the fit, the
+    # few distinct values making "value" categorical
+    assert X_test.tolist() == [[0, 0], [0, 0]]
+    assert (np.concatenate([X_train, X_valid]) > 0).all()
+
+
+def test_fit_chunks_matches_fit():
+    rng = np.random.default_rng(0)
+    df = frame(rng.choice(list("abcd"), 50), rng.normal(size=50), rng.integers(0, 2, 50))
+    df.loc[::7, "value"] = np.nan
+    chunked = TabularPreprocessor(["sector", "value"], "target", max_categories=10)
+    chunked.fit_chunks(lambda: (df.iloc[a:a + 8] for a in range(0, 50, 8)))
+    full = TabularPreprocessor(["sector", "value"], "target", max_categories=10).fit(df)
+    assert chunked.categorical == full.categorical == ["sector", "target"]
+    assert sorted(chunked.categories["sector"]) == full.categories["sector"]
+    np.testing.assert_allclose(chunked.stats["mean"], full.stats["mean"])
+    np.testing.assert_allclose(chunked.scale, full.scale)
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+from price_matrix import PriceMatrix
+
+
+# Two projects with overlapping tickers and dates, B is in both and taken
+# from the first one
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    frames = {}
+    for project, tickers, start in [("p1", ["A", "B"], "2021-01-01"),
+                                    ("p2", ["B", "C"], "2021-01-10")]:
+        os.makedirs(f"data/{project}")
+        index = pd.date_range(start, periods=20, name="Date")
+        df = pd.DataFrame(rng.normal(size=(20, 2)), index=index, columns=tickers)
+        df.iloc[3, 0] = np.nan
+        storage.write(df, "prices_daily", project)
+        frames[project] = df
+    return frames
+
+
+# Wide frame of all the projects, built with pandas
+def baseline(frames):
+    df = frames["p1"].join(frames["p2"][["C"]], how="outer")
+    return df.sort_index()
+
+
+def test_build_matches_pandas(stores):
+    expected = baseline(stores)
+    matrix = PriceMatrix.build(["p1", "p2"], dtype=np.float64)
+    pd.testing.assert_frame_equal(matrix.frame(), expected, check_names=False,
+                                  check_freq=False)
+    np.testing.assert_array_equal(matrix.mask, expected.notnull().to_numpy())
+    for date in expected.index[::5]:
+        for ticker in expected.columns:
+            np.testing.assert_equal(matrix.get(date, ticker),
+                                    expected.loc[date, ticker])
+
+
+def test_slices_and_long_match_pandas(stores):
+    expected = baseline(stores)
+    matrix = PriceMatrix.build(["p1", "p2"], dtype=np.float64)
+    start, end = "2021-01-05", "2021-01-15"
+    window = expected[(expected.index >= start) & (expected.index < end)]
+    pd.testing.assert_frame_equal(matrix.frame(start, end, ["C", "A"]),
+                                  window[["C", "A"]], check_names=False,
+                                  check_freq=False)
+    long = expected[["C", "A"]].reset_index().melt(id_vars="Date")
+    pd.testing.assert_frame_equal(matrix.long(["C", "A", "A", "Z"]), long,
+                                  check_names=False)
+
+
+def test_save_load_and_cache(stores):
+    matrix = PriceMatrix.build(["p1", "p2"])
+    matrix.save("prices_daily_float32")
+    loaded = PriceMatrix.load("prices_daily_float32")
+    np.testing.assert_array_equal(loaded.values, matrix.values)
+    assert loaded.dates.equals(matrix.dates)
+    assert loaded.tickers.tolist() == ["A", "B", "C"]
+    cached = PriceMatrix.cached(["p1", "p2"])
+    assert cached.values.dtype == np.float32
+    np.testing.assert_array_equal(cached.values, matrix.values)
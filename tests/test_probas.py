@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from probas import Probas
+
+DATES = pd.to_datetime(["2021-01-04", "2021-02-01", "2021-03-01"])
+
+
+# Scores of two statements of A and one of B on each window date, the
+# latest statement of A having the lowest score
+def scores():
+    rows = []
+    for i, date in enumerate(DATES):
+        rows += [(date, "A", pd.Timestamp("2019-12-31"), 0.8 + i / 100),
+                 (date, "A", pd.Timestamp("2020-12-31"), 0.2 + i / 100),
+                 (date, "B", pd.Timestamp("2020-06-30"), 0.5)]
+    return pd.DataFrame(rows, columns=["date", "symbol", "statement", "proba"])
+
+
+@pytest.mark.parametrize("how, expected", [("max", 0.8), ("mean", 0.5), ("last", 0.2)])
+def test_from_scores(how, expected):
+    table = Probas.from_scores(scores().sample(frac=1, random_state=0), DATES, how).table
+    # The last date only closes the window of the previous one
+    assert table.date_start.tolist() == [DATES[0]] * 2 + [DATES[1]] * 2
+    assert table.date_end.tolist() == [DATES[1]] * 2 + [DATES[2]] * 2
+    assert table.symbol.tolist() == ["A", "B", "A", "B"]
+    assert table.proba.tolist() == pytest.approx([expected, 0.5, expected + 0.01, 0.5])
+
+
+def test_unknown_aggregation():
+    with pytest.raises(ValueError):
+        Probas.from_scores(scores(), DATES, "median")
@@ -0,0 +1,38 @@
+import numpy as np
+
+from score import Scorer
+
+
+# Model counting the scored rows
+class Model:
+
+    def __init__(self):
+        self.rows = 0
+
+    def predict_proba(self, X):
+        self.rows += len(X)
+        p = 1 / (1 + np.exp(-X.sum(axis=1)))
+        return np.stack([1 - p, p], axis=1)
+
+
+def test_cache_depends_on_the_rows():
+    model = Model()
+    scorer = Scorer(model, None, batch_size=2)
+    X = np.arange(12, dtype=np.float32).reshape(6, 2) / 10
+    first = scorer.predict(X, "test")
+    assert scorer.predict(X, "test") is first
+    assert model.rows == 6
+    # Same key, other rows or other values
+    np.testing.assert_allclose(scorer.predict(X, "test", [4, 1]),
+                               first[[1, 4]], rtol=1e-6)
+    changed = scorer.predict(X * 2, "test")
+    assert model.rows == 14
+    assert not np.allclose(changed, first)
+
+
+def test_cache_is_bounded():
+    scorer = Scorer(Model(), None, cache_size=2)
+    X = np.zeros((3, 2), dtype=np.float32)
+    for key in ["a", "b", "a", "c"]:
+        scorer.predict(X, key)
+    assert [a[0] for a in scorer.cache] == ["a", "c"]
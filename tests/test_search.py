@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+import search
+
+
+def test_resume_requires_the_same_parameters(tmp_path):
+    store = search.TrialStore(str(tmp_path / "search.sqlite"))
+    key = search.search_key(0, search.SPACE, 4, 1, 10, 5, "data")
+    store.check("s", key)
+    store.check("s", key)
+    with pytest.raises(ValueError):
+        store.check("s", search.search_key(1, search.SPACE, 4, 1, 10, 5, "data"))
+    # The trials are not resumed on another dataset
+    with pytest.raises(ValueError):
+        store.check("s", search.search_key(0, search.SPACE, 4, 1, 10, 5, "new"))
+    store.check("other", search.search_key(1, search.SPACE, 4, 1, 10, 5, "data"))
+
+
+def test_median_pruning_per_epoch(tmp_path):
+    store = search.TrialStore(str(tmp_path / "search.sqlite"))
+    for number, value in enumerate([0.6, 0.62, 0.64, 0.66]):
+        store.start("s", number, {})
+        store.report("s", number, 0, 3, value)
+    assert store.should_prune("s", 4, 0, 3, 0.6)
+    assert not store.should_prune("s", 4, 0, 3, 0.65)
+    # No other trial reached this epoch
+    assert not store.should_prune("s", 4, 0, 4, 0.1)
+
+
+def test_time_folds_are_purged():
+    dates = pd.date_range("2010-01-01", periods=10, freq="YS")
+    for train, valid in search.time_folds(dates, n_folds=4, purge=1):
+        assert dates[train].max() + pd.DateOffset(years=1) <= dates[valid].min()
+
+
+def test_split_params():
+    params = search.sample(3)
+    model_params, fit_params = search.split_params(params)
+    assert set(fit_params) == set(search.FIT_PARAMS)
+    assert {**model_params, **fit_params} == params
+    assert params == search.sample(3)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulator import rebalance_days, simulate
+
+
+# Day by day simulation of the same portfolio, per unit of wealth at the
+# last rebalancing
+def loop_simulate(weights, returns, mask, cost, slippage):
+    w = np.nan_to_num(np.asarray(weights, dtype=float))
+    r = np.nan_to_num(np.asarray(returns, dtype=float))
+    holdings = np.zeros(w.shape[1])
+    cash = 0.0
+    rows = []
+    for t in range(len(r)):
+        traded = 0.0
+        if mask[t]:
+            value = holdings.sum() + cash
+            drifted = holdings / value if t > 0 else holdings
+            traded = np.abs(w[t] - drifted).sum()
+            holdings = w[t].copy()
+            cash = 1 - w[t].sum()
+        previous = holdings.sum() + cash
+        holdings = holdings * (1 + r[t])
+        gross = (holdings.sum() + cash) / previous
+        net = gross * (1 - traded * (cost + slippage)) - 1
+        rows.append([net, gross - 1, traded / 2])
+    rows = np.array(rows)
+    return rows[:, 0], rows[:, 1], rows[:, 2]
+
+
+@pytest.fixture
+def market():
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2021-01-01", periods=130)
+    returns = pd.DataFrame(rng.normal(0, 0.02, (130, 4)), index=index)
+    returns.iloc[5, 2] = np.nan
+    weights = rng.random((130, 4))
+    weights /= weights.sum(axis=1, keepdims=True) * 1.25
+    return weights, returns
+
+
+@pytest.mark.parametrize("calendar", ["daily", "weekly", "monthly", "quarterly"])
+def test_simulate_matches_loop(market, calendar):
+    weights, returns = market
+    result = simulate(weights, returns, calendar, cost=0.001, slippage=0.0005)
+    mask = rebalance_days(returns.index, calendar)
+    net, gross, turnover = loop_simulate(weights, returns, mask, 0.001, 0.0005)
+    np.testing.assert_allclose(result.returns, net, atol=1e-12)
+    np.testing.assert_allclose(result.gross_returns, gross, atol=1e-12)
+    np.testing.assert_allclose(result.turnover, turnover, atol=1e-12)
+    np.testing.assert_allclose(result.value, np.cumprod(1 + net), rtol=1e-10)
+    assert result.rebalance.tolist() == mask.tolist()
+
+
+def test_explicit_calendar(market):
+    weights, returns = market
+    dates = returns.index[[0, 17, 40, 41, 100]]
+    result = simulate(weights, returns, dates, cost=0.002)
+    mask = returns.index.isin(dates)
+    net, _, turnover = loop_simulate(weights, returns, mask, 0.002, 0)
+    np.testing.assert_allclose(result.returns, net, atol=1e-12)
+    np.testing.assert_allclose(result.turnover, turnover, atol=1e-12)
+    # Arrays take the rebalancing mask as calendar
+    arrays = simulate(weights, returns.to_numpy(), mask, cost=0.002)
+    np.testing.assert_allclose(arrays.returns, net, atol=1e-12)
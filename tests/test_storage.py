@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+import storage
+
+
+def test_numeric_strings_are_converted():
+    df = pd.DataFrame({"date": ["2021-01-01"], "symbol": ["A"],
+                       "netIncome": pd.Series(["12.5"], dtype=object)})
+    df = storage.apply_schema(df, "incomeStatementHistory")
+    assert df.netIncome.tolist() == [12.5]
+    assert df.date.dtype.kind == "M"
+
+
+def test_undeclared_text_column_raises(tmp_path):
+    df = pd.DataFrame({"date": ["2021-01-01"], "symbol": ["A"],
+                       "industry": ["Software"]})
+    with pytest.raises(ValueError, match="industry"):
+        storage.write(df, "incomeStatementHistory", root=str(tmp_path))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeseries import AsofIndex
+
+
+# Long table with duplicated dates and unsorted rows, and queries on known,
+# unknown and out of range dates and symbols
+def table(seed=0, rows=200):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "symbol": rng.choice(["A", "B", "C"], rows),
+        "date": pd.Timestamp("2020-01-01")
+        + pd.to_timedelta(rng.integers(0, 400, rows), unit="D"),
+        "value": np.where(rng.random(rows) < 0.2, np.nan, rng.normal(size=rows)),
+    })
+    queries = pd.DataFrame({
+        "symbol": rng.choice(["A", "B", "C", "Z"], rows),
+        "date": pd.Timestamp("2019-12-01")
+        + pd.to_timedelta(rng.integers(0, 500, rows), unit="D"),
+    })
+    return df, queries
+
+
+# Position of the expected row in the sorted table of the index, from a loop
+# over the rows of the symbol
+def brute_lookup(symbols, dates, symbol, date, direction="backward"):
+    best = -1
+    for i in np.flatnonzero(symbols == symbol):
+        row_date = dates[i]
+        if row_date <= date:
+            distance = (date - row_date).days
+            if direction == "backward" or best < 0 or distance <= best_distance:
+                best, best_distance = i, distance
+        elif direction == "nearest":
+            distance = (row_date - date).days
+            if best < 0 or distance < best_distance:
+                best, best_distance = i, distance
+    return best
+
+
+@pytest.mark.parametrize("direction", ["backward", "nearest"])
+@pytest.mark.parametrize("offset", [None, pd.DateOffset(years=1), -pd.DateOffset(months=3)])
+def test_lookup_matches_brute_force(direction, offset):
+    df, queries = table()
+    index = AsofIndex(df)
+    positions = index.lookup(queries.symbol, queries.date, offset, direction)
+    dates = index.df.date if offset is None else index.df.date + offset
+    expected = [brute_lookup(index.df.symbol.to_numpy(), dates.tolist(), s, d,
+                             direction)
+                for s, d in zip(queries.symbol, queries.date)]
+    assert positions.tolist() == expected
+
+
+def test_lookup_matches_merge_asof():
+    df, queries = table(1)
+    queries = queries.sort_values("date").reset_index(drop=True)
+    index = AsofIndex(df)
+    positions = index.lookup(queries.symbol, queries.date)
+    right = df.sort_values("date", kind="mergesort")
+    expected = pd.merge_asof(queries, right, on="date", by="symbol")
+    pd.testing.assert_series_equal(index.take(positions, "value"),
+                                   expected.value, check_names=False)
+
+
+# Trailing aggregate from a loop over the rows dated in (date - window, date]
+def brute_trailing(df, symbol, date, window, how):
+    rows = df[(df.symbol == symbol) & (df.date > date - window) & (df.date <= date)]
+    values = rows.value.dropna()
+    if how == "count":
+        return len(values)
+    if how == "sum":
+        return values.sum()
+    return values.mean() if len(values) else np.nan
+
+
+@pytest.mark.parametrize("how", ["sum", "count", "mean"])
+@pytest.mark.parametrize("window", [pd.DateOffset(years=1), pd.DateOffset(days=30)])
+def test_trailing_matches_brute_force(how, window):
+    df, queries = table(2)
+    index = AsofIndex(df)
+    result = index.trailing(queries.symbol, queries.date, "value", window, how)
+    expected = [brute_trailing(df, s, d, window, how)
+                for s, d in zip(queries.symbol, queries.date)]
+    np.testing.assert_allclose(result, expected)
@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+
+import storage
+from walkforward import WalkForward
+
+DATES = pd.to_datetime(["2021-01-04", "2021-02-01", "2021-03-01"])
+
+
+def engine(tmp_path, **params):
+    return WalkForward(["value"], "target", backend="logistic",
+                       data_root=str(tmp_path / "data"),
+                       root=str(tmp_path / "backtest"), **params)
+
+
+def data(values=(1.0, 2.0, 3.0)):
+    return pd.DataFrame({"date": DATES, "symbol": ["A"] * 3,
+                         "value": list(values), "target": [0, 1, 0]})
+
+
+def write(walkforward, dates):
+    for date in dates:
+        walkforward.write(date, pd.DataFrame({"date": [date], "symbol": ["A"],
+                                              "statement": [date], "proba": [0.5]}))
+        with open(walkforward.model_path(date), "w") as f:
+            f.write("model")
+
+
+def test_key_depends_on_the_parameters_only(tmp_path):
+    walkforward = engine(tmp_path)
+    assert engine(tmp_path).key == walkforward.key
+    assert engine(tmp_path, cadence="monthly").key != walkforward.key
+    changed = data().assign(value=5.0)
+    assert walkforward.fingerprints(changed, DATES) != walkforward.fingerprints(data(), DATES)
+
+
+def test_windows_invalidated_by_their_rows(tmp_path):
+    walkforward = engine(tmp_path)
+    df = data()
+    walkforward.done(walkforward.fingerprints(df, DATES))
+    write(walkforward, DATES)
+    assert walkforward.done(walkforward.fingerprints(df, DATES)) == set(DATES)
+    assert walkforward.load(DATES[:1]).proba.tolist() == [0.5]
+
+    # The order of the rows does not matter
+    shuffled = df.iloc[[2, 0, 1]]
+    assert walkforward.done(walkforward.fingerprints(shuffled, DATES)) == set(DATES)
+
+    # A new date keeps all the windows, a changed row only removes the
+    # windows and models dated from it
+    new = pd.concat([df, df.tail(1).assign(date=pd.Timestamp("2021-04-01"))])
+    dates = list(DATES) + [pd.Timestamp("2021-04-01")]
+    assert walkforward.done(walkforward.fingerprints(new, dates)) == set(DATES)
+    new.loc[1, "value"] = 10.0
+    assert walkforward.done(walkforward.fingerprints(new, dates)) == {DATES[0]}
+    assert [os.path.exists(walkforward.model_path(a)) for a in DATES] == [True, False, False]
+
+    # New parameters remove everything
+    assert engine(tmp_path, chain=2).done() == set()
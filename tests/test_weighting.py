@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import weighting
+
+SCORES = np.array([[0.1, 0.9, np.nan, 0.5],
+                   [0.7, 0.2, 0.3, np.nan]])
+
+
+@pytest.mark.parametrize("n", [0, -1])
+def test_top_n_rejects_empty_portfolios(n):
+    with pytest.raises(ValueError):
+        weighting.top_n(SCORES, n)
+
+
+def test_top_n():
+    weights = weighting.top_n(SCORES, 2)
+    np.testing.assert_allclose(weights, [[0, 0.5, 0, 0.5], [0.5, 0, 0.5, 0]])
+
+
+def test_top_n_clipped_to_the_tickers():
+    weights = weighting.top_n(SCORES, 10)
+    np.testing.assert_allclose(weights, np.where(np.isnan(SCORES), 0, 0.25))
+    assert weighting.top_mask(SCORES, 10).sum() == 6
+
+
+def test_sweep_top_n_matches_top_n():
+    returns = np.array([[0.01, 0.02, 0.03, 0.04], [0.02, -0.01, 0.0, 0.05]])
+    sweep = weighting.sweep_top_n(SCORES, returns, [1, 2, 10])
+    for size, value in zip(sweep.nb, sweep["yield"]):
+        daily = weighting.portfolio_returns(returns, weighting.top_n(SCORES, size))
+        assert value == pytest.approx(np.prod(1 + daily))
+
+
+def test_sweep_top_n_rejects_empty_portfolios():
+    with pytest.raises(ValueError):
+        weighting.sweep_top_n(SCORES, SCORES, [0, 1, 2])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+
+# Days since epoch of a datetime series
+def _days(dates):
+    return np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+
+# Sorted (symbol, date) index over a long table, answering as-of lookups
+# for all the symbols at once with searchsorted
+class AsofIndex:
+
+    def __init__(self, df, by="symbol", on="date"):
+        self.on = on
+        self.df = df.sort_values([by, on], kind="mergesort").reset_index(drop=True)
+        self.symbols = pd.Index(self.df[by].unique())
+        self.codes = self.symbols.get_indexer(self.df[by])
+        self.keys = {}
+
+    # Composite sorted keys, optionally on the dates shifted by an offset
+    def _keys(self, offset=None):
+        if offset not in self.keys:
+            dates = self.df[self.on]
+            if offset is not None:
+                dates = dates + offset
+            days = _days(dates)
+            base = days.min() - 1
+            span = days.max() - base + 2
+            self.keys[offset] = (self.codes * span + days - base, base, span)
+        return self.keys[offset]
+
+    # Composite keys of (symbol, date) queries, dates outside of the table
+    # range are clipped so they stay within the block of their symbol
+    def _query(self, symbols, dates, offset=None):
+        keys, base, span = self._keys(offset)
+        codes = self.symbols.get_indexer(symbols)
+        days = np.clip(_days(dates) - base, 0, span - 1)
+        return keys, codes, codes * span + days
+
+    # Position of the matching row for each (symbol, date), -1 if none.
+    # Same rules as merge_asof: backward takes the last row at or before
+    # the date, nearest takes the closest row and the backward one on ties.
+    def lookup(self, symbols, dates, offset=None, direction="backward"):
+        keys, codes, query = self._query(symbols, dates, offset)
+        backward = np.searchsorted(keys, query, side="right") - 1
+        valid = (codes >= 0) & (backward >= 0)
+        valid[valid] = self.codes[backward[valid]] == codes[valid]
+        backward = np.where(valid, backward, -1)
+        if direction == "backward":
+            return backward
+        forward = np.searchsorted(keys, query, side="left")
+        valid = (codes >= 0) & (forward < len(keys))
+        valid[valid] = self.codes[forward[valid]] == codes[valid]
+        forward = np.where(valid, forward, -1)
+        distance_backward = np.where(backward >= 0, query - keys[backward], np.inf)
+        distance_forward = np.where(forward >= 0, keys[forward] - query, np.inf)
+        return np.where(distance_forward < distance_backward, forward, backward)
+
+    # Values of a column at the positions returned by lookup
+    def take(self, positions, column):
+        values = self.df[column].iloc[np.maximum(positions, 0)].reset_index(drop=True)
+        return values.where(positions >= 0)
+
+    # Trailing window aggregate (sum, count or mean) of a column over the
+    # rows dated in (date - window, date], from cumulative sums
+    def trailing(self, symbols, dates, column, window, how="sum"):
+        keys, codes, query = self._query(symbols, dates)
+        _, _, query_start = self._query(symbols, dates - window)
+        end = np.searchsorted(keys, query, side="right")
+        start = np.searchsorted(keys, query_start, side="right")
+        values = self.df[column].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        count = np.concatenate([[0], np.cumsum(present)])
+        count = np.where(codes >= 0, count[end] - count[start], 0)
+        if how == "count":
+            return count
+        total = np.concatenate([[0], np.cumsum(np.where(present, values, 0))])
+        total = np.where(count > 0, total[end] - total[start], 0)
+        if how == "sum":
+            return total
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+import storage
+from preprocessor import TabularPreprocessor
+
+# Retraining cadences, as pandas periods
+CADENCES = {"daily": "D", "monthly": "M", "quarterly": "Q"}
+
+# Columns of the stored window scores, a score per statement row
+COLUMNS = ["date", "symbol", "statement", "proba"]
+
+# Dataset read by each worker, once per process
+_worker = {}
+
+
+def _init_worker(threads, dataset, root):
+    # Torch threads are pinned so that the workers do not oversubscribe
+    # the cores
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    _worker["data"] = storage.read(dataset, root=root)
+
+
+# First window date of each retraining period
+def retrain_dates(dates, cadence="daily"):
+    dates = pd.DatetimeIndex(sorted(dates))
+    periods = dates.to_period(CADENCES[cadence])
+    return list(dates[~periods.duplicated()])
+
+
+# Train the models of a block of retrains and score their windows, the
+# statement rows of the year before each window date. The first model
+# of the block is trained from scratch, the next ones are fine-tuned from
+# the weights of the previous retrain. Models and scores already stored
+# are reused.
+def fit_block(engine, block):
+    import backends
+    from utils import process_data
+    data = _worker["data"]
+    for position, (date, preprocessor, windows) in enumerate(block):
+        windows = [a for a in windows if not os.path.exists(engine.path(a))]
+        model = engine.model_path(date)
+        if os.path.exists(model):
+            if not windows:
+                continue
+            clf = backends.load(model)
+        else:
+            date_train = date - relativedelta(years=1)
+            clf, X_train, y_train, _, _, _, _, _ = \
+                process_data(data, date_train, date, engine.features,
+                             engine.target, preprocessor, engine.backend,
+                             splits=["train"])
+            fit_params = dict(engine.fit_params)
+            warm_start = False
+            previous = engine.model_path(block[position - 1][0])
+            if clf.warm_start and position > 0 and os.path.exists(previous):
+                warm = backends.load_warm(previous, clf)
+                # New categories change the embeddings, the model is then
+                # trained from scratch
+                if warm.cat_dims == clf.cat_dims:
+                    clf = warm
+                    warm_start = True
+                    fit_params["max_epochs"] = engine.fine_tune_epochs
+            clf.fit(X_train=X_train,
+                    y_train=y_train,
+                    eval_set=[(X_train, y_train)],
+                    eval_name=['train'],
+                    warm_start=warm_start,
+                    **fit_params)
+            clf.save(model)
+        for window in windows:
+            rows = ((data.date > window - relativedelta(years=1))
+                    & (data.date <= window)).values
+            scores = pd.DataFrame({"date": window,
+                                   "symbol": data.symbol.values[rows],
+                                   "statement": data.date.values[rows],
+                                   "proba": clf.predict_proba(
+                                       preprocessor.transform(data[rows]))[:, 1]})
+            engine.write(window, scores)
+    return [window for _, _, windows in block for window in windows]
+
+
+# Walk-forward backtest where the models are retrained at a given cadence,
+# the windows in between being scored with the last model. Retrains are
+# grouped in blocks of warm-started models, each block being an independent
+# task run in a process pool. The scores of a window are written as soon as
+# they are computed, so an interrupted run is resumed, and new dates or
+# changed rows only run the windows they affect.
+class WalkForward:
+
+    def __init__(self, features, target, workers=4, threads=1,
+                 cadence="daily", chain=1, fine_tune_epochs=10, backend="tabnet",
+                 fit_params=None, dataset="data_clean", data_root="data",
+                 root="backtest"):
+        from backends import FIT_PARAMS
+        self.features = list(features)
+        self.target = target
+        self.workers = workers
+        self.threads = threads
+        self.cadence = cadence
+        # Number of retrains of a block, 1 trains all the models from scratch
+        self.chain = chain
+        self.fine_tune_epochs = fine_tune_epochs
+        # Model backend (tabnet, hgb or logistic) and its training parameters
+        self.backend = backend
+        self.fit_params = FIT_PARAMS[backend] if fit_params is None else fit_params
+        self.dataset = dataset
+        self.data_root = data_root
+        self.root = root
+        self.project = "windows"
+
+    # Key of the parameters the stored windows were computed with
+    @property
+    def key(self):
+        params = {"features": self.features, "target": self.target,
+                  "cadence": self.cadence, "chain": self.chain,
+                  "fine_tune_epochs": self.fine_tune_epochs, "backend": self.backend,
+                  "fit_params": self.fit_params, "dataset": self.dataset,
+                  "columns": COLUMNS}
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    # Fingerprint of the rows dated up to each date, which the model and the
+    # scores of the window of that date depend on, and of the categorical
+    # columns inferred from the whole dataset. The row hashes are summed so
+    # that the order of the rows does not matter.
+    def fingerprints(self, data, dates, categorical=()):
+        columns = list(dict.fromkeys(["date", "symbol"] + self.features
+                                     + [self.target]))
+        hashes = pd.util.hash_pandas_object(data[columns], index=False).to_numpy()
+        order = np.argsort(data.date.values, kind="stable")
+        sums = np.concatenate([np.zeros(1, np.uint64), np.cumsum(hashes[order])])
+        ends = np.searchsorted(data.date.values[order],
+                               np.array(dates, dtype="datetime64[ns]"), side="right")
+        columns = hashlib.sha256(json.dumps(sorted(categorical)).encode()).hexdigest()
+        return {date: f"{end}-{sums[end]:016x}-{columns[:16]}"
+                for date, end in zip(dates, ends)}
+
+    @property
+    def directory(self):
+        return os.path.join(self.root, self.project)
+
+    def path(self, date, prefix=""):
+        return storage.path(f"{prefix}{date:%Y-%m-%d}", self.project, self.root)
+
+    def model_path(self, date):
+        from backends import BACKENDS
+        return os.path.join(self.directory, "models",
+                            f"{date:%Y-%m-%d}{BACKENDS[self.backend].extension}")
+
+    # Scores written to a hidden file first, a window interrupted while
+    # being written is run again
+    def write(self, date, scores):
+        storage.write(scores, f".{date:%Y-%m-%d}", self.project, self.root)
+        os.replace(self.path(date, "."), self.path(date))
+
+    # Dates of the stored windows. All the windows and models are removed
+    # when the parameters changed, and a window and the model of its date
+    # when the fingerprint of its rows changed.
+    def done(self, fingerprints=None):
+        manifest = os.path.join(self.directory, "params.json")
+        stored = {}
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                stored = json.load(f)
+        key = self.key
+        if stored.get("key") != key:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(os.path.join(self.directory, "models"))
+            stored = {"key": key, "windows": {}}
+        for date, fingerprint in (fingerprints or {}).items():
+            name = f"{date:%Y-%m-%d}"
+            if stored["windows"].get(name) != fingerprint:
+                for path in [self.path(date), self.model_path(date)]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                stored["windows"][name] = fingerprint
+        with open(manifest, "w") as f:
+            json.dump(stored, f)
+        return {pd.Timestamp(name[:-len(".parquet")])
+                for name in os.listdir(self.directory)
+                if name.endswith(".parquet") and not name.startswith(".")}
+
+    # Retrain dates and the windows each of them scores
+    def schedule(self, dates):
+        retrains = retrain_dates(dates, self.cadence)
+        windows = {date: [] for date in retrains}
+        for date in sorted(dates):
+            windows[max(a for a in retrains if a <= date)].append(date)
+        return windows
+
+    # Run the missing windows of the dates, yielding each date when its
+    # scores are written. The preprocessor of a retrain is fitted on an
+    # expanding window of the rows up to its date.
+    def run(self, data, dates):
+        dates = [pd.Timestamp(a) for a in dates]
+        preprocessor = TabularPreprocessor(self.features, self.target).infer(data)
+        done = self.done(self.fingerprints(data, dates, preprocessor.categorical))
+        windows = self.schedule(dates)
+        retrains = list(windows)
+        pending = [i for i, date in enumerate(retrains)
+                   if any(a not in done for a in windows[date])]
+        if not pending:
+            return
+        # Blocks of the retrains, counted from the first date so that they
+        # do not change when new dates are added
+        blocks = {}
+        date_fitted = None
+        for i, date in enumerate(retrains[:pending[-1] + 1]):
+            new_rows = data.date <= date
+            if date_fitted is not None:
+                new_rows &= data.date > date_fitted
+            preprocessor.partial_fit(data[new_rows])
+            date_fitted = date
+            blocks.setdefault(i // self.chain, []).append(
+                (date, copy.deepcopy(preprocessor), windows[date]))
+        blocks = [blocks[a] for a in sorted({i // self.chain for i in pending})]
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.threads, self.dataset,
+                                           self.data_root)) as pool:
+            futures = [pool.submit(fit_block, self, block) for block in blocks]
+            for future in as_completed(futures):
+                for date in future.result():
+                    if date not in done:
+                        yield date
+
+    # Scores of the stored windows of the dates
+    def load(self, dates):
+        frames = [storage.read(f"{pd.Timestamp(date):%Y-%m-%d}", self.project,
+                               self.root)
+                  for date in dates]
+        return pd.concat(frames, ignore_index=True)
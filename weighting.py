@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+
+# Portfolio weights computed on a whole (days x tickers) score matrix at
+# once. Missing scores (NaN) are never selected and get a zero weight, so
+# that the weights of a day sum to at most 1, the rest being kept in cash.
+
+def _values(x):
+    return np.asarray(x, dtype=float)
+
+
+# Same type as the scores: dataframe with its labels or array
+def _like(values, scores):
+    if isinstance(scores, pd.DataFrame):
+        return pd.DataFrame(values, index=scores.index, columns=scores.columns)
+    return values
+
+
+# Rows normalized to sum to 1, rows without any positive value stay at 0
+def _normalize(values):
+    total = values.sum(axis=1, keepdims=True)
+    return np.divide(values, total, out=np.zeros_like(values), where=total > 0)
+
+
+# Softmax of the scores of each day over the available tickers
+def softmax(scores, temperature=1.0):
+    x = _values(scores)
+    present = ~np.isnan(x)
+    with np.errstate(invalid="ignore"):
+        top = np.max(np.where(present, x, -np.inf), axis=1, keepdims=True)
+        e = np.where(present, np.exp((x - top) / temperature), 0)
+    return _like(_normalize(e), scores)
+
+
+# Mask of the n best scores of each day, ties broken arbitrarily. n is
+# clipped to the number of tickers.
+def top_mask(scores, n):
+    if n < 1:
+        raise ValueError(f"Portfolio size must be at least 1, got {n}")
+    x = _values(scores)
+    n = min(n, x.shape[1])
+    present = ~np.isnan(x)
+    mask = present.copy()
+    if n < x.shape[1]:
+        best = np.argpartition(np.where(present, -x, np.inf), n - 1, axis=1)[:, :n]
+        mask = np.zeros_like(present)
+        np.put_along_axis(mask, best, True, axis=1)
+        mask &= present
+    return mask
+
+
+# Equal weights on the n best scores of each day, 1 / n each
+def top_n(scores, n):
+    mask = top_mask(scores, n)
+    return _like(mask / min(n, mask.shape[1]), scores)
+
+
+# Weights proportional to the rank of the scores of each day (the best of
+# k scores has a weight k times higher than the worst), optionally on the
+# n best scores only
+def rank(scores, n=None):
+    x = _values(scores)
+    present = ~np.isnan(x) if n is None else top_mask(x, n)
+    # Position of each score in the day, 0 for the best one
+    order = np.where(present, -x, np.inf).argsort(axis=1).argsort(axis=1)
+    weights = np.where(present, present.sum(axis=1, keepdims=True) - order, 0)
+    return _like(_normalize(weights.astype(float)), scores)
+
+
+# Weights proportional to the scores of each day
+def proportional(scores, n=None):
+    x = _values(scores)
+    present = ~np.isnan(x) if n is None else top_mask(x, n)
+    return _like(_normalize(np.where(present, np.clip(x, 0, None), 0)), scores)
+
+
+# Daily returns of the portfolios, missing returns counting as 0
+def portfolio_returns(returns, weights):
+    values = np.nansum(_values(returns) * _values(weights), axis=1)
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(values, index=returns.index)
+    return values
+
+
+def cumulative(returns):
+    return (1 + returns).cumprod()
+
+
+# Final cumulative return of the equal-weight top-N portfolios for all the
+# sizes at once: the returns of each day are ranked by score once, and the
+# portfolio of size n earns the cumulative sum of its n first returns / n.
+# Sizes are clipped to the number of tickers.
+def sweep_top_n(scores, returns, sizes):
+    sizes = np.asarray(sizes)
+    if (sizes < 1).any():
+        raise ValueError(f"Portfolio sizes must be at least 1, got {sizes[sizes < 1]}")
+    x = _values(scores)
+    r = _values(returns)
+    order = np.where(np.isnan(x), np.inf, -x).argsort(axis=1)
+    ranked = np.take_along_axis(np.where(np.isnan(x) | np.isnan(r), 0, r),
+                                order, axis=1)
+    n = np.minimum(sizes, x.shape[1])
+    total = np.cumsum(ranked, axis=1)[:, n - 1] / n
+    return pd.DataFrame({"nb": sizes, "yield": np.prod(1 + total, axis=0)})